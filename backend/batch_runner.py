@@ -0,0 +1,345 @@
+"""
+Bulk / offline query runner for the SLA and KB pipelines.
+
+Usage (from the backend folder):
+  python batch_runner.py open_tickets.txt --out summaries.jsonl
+  python batch_runner.py questions.jsonl --out answers.jsonl --pipeline kb --concurrency 8 --rpm 300
+
+Input formats:
+  .txt    one question or bare ticket id per line (ticket ids are expanded with --template)
+  .jsonl  {"id": "...", "question": "...", "pipeline": "sla"|"kb"}  (id/pipeline optional;
+          {"ticket_id": "IN0042923"} is also accepted and expanded with --template)
+
+Without an explicit id, a ticket-only line is identified by its ticket id and any other line by a
+hash of its question. An id that appears twice in one input is run once and counted as "duplicate".
+
+Results are streamed to the --out JSONL file as they complete, one line per item:
+  {"id", "pipeline", "question", "answer", "error", "seconds"}
+The output file doubles as the checkpoint: re-running the same command skips every id that
+already has a line in it, so an interrupted run resumes where it stopped (a line torn by a crash
+is cut off before appending and its item runs again). With --retry-errors,
+items whose last attempt failed are run again (the newest line for an id wins).
+
+Items are processed in batches: each batch is retrieved with one embeddings call (identical
+retrieval queries are searched once), then answered by a bounded worker pool. Identical contexts
+are anonymized once per run; that cache holds PII and is dropped when the run ends. Before each LLM call the runner waits for Azure OpenAI capacity reported by
+the gateway (deployments off cooldown with TPM headroom) and respects the optional --rpm cap.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+from ticket_fast_path import ticket_id_in_cell
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TEMPLATE = (
+    "Summarize ticket {ticket_id}: current status, assigned engineer, last update "
+    "and whether the SLA is at risk."
+)
+PROGRESS_EVERY = 50
+
+
+class BatchItem:
+    __slots__ = ("id", "question", "pipeline")
+
+    def __init__(self, item_id: str, question: str, pipeline: str):
+        self.id = item_id
+        self.question = question
+        self.pipeline = pipeline
+
+
+def _item_id(question: str) -> str:
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()[:12]
+
+
+def read_items(path: str, default_pipeline: str, template: str) -> Iterator[BatchItem]:
+    """Yield items from a .txt or .jsonl file; bare ticket ids become templated questions."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"[warn] {path}:{line_no}: skipped invalid JSON ({e})")
+                    continue
+                ticket_id = record.get("ticket_id")
+                question = record.get("question")
+                if question:
+                    # several questions may concern one ticket, so the question itself is the identity
+                    item_id = record.get("id") or _item_id(question)
+                elif ticket_id:
+                    question = template.format(ticket_id=ticket_id)
+                    item_id = record.get("id") or ticket_id
+                else:
+                    print(f"[warn] {path}:{line_no}: skipped, no question or ticket_id")
+                    continue
+                item_id = str(item_id)
+                yield BatchItem(item_id, question, record.get("pipeline", default_pipeline))
+            else:
+                ticket_id = ticket_id_in_cell(line)
+                if ticket_id:
+                    yield BatchItem(ticket_id, template.format(ticket_id=ticket_id), default_pipeline)
+                else:
+                    yield BatchItem(_item_id(line), line, default_pipeline)
+
+
+def load_checkpoint(out_path: str, retry_errors: bool) -> set:
+    """Ids already finished in a previous run of the same output file."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            if record.get("error") and retry_errors:
+                # the newest line for an id wins
+                done.discard(record.get("id"))
+            else:
+                done.add(record.get("id"))
+    return done
+
+
+class RatePacer:
+    """Spaces out calls to at most `rpm` per minute across all workers (0 = unlimited)."""
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _truncate_torn_line(path: str):
+    """Cut an unterminated last line left by a crash mid-write, so the next record starts on its own line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        if pos < end:
+            print(f"[warn] {path}: dropped a torn last line from an interrupted run ({end - pos} bytes)")
+            f.truncate(pos)
+
+
+class JsonlWriter:
+    """Thread-safe append-only JSONL writer; each line is flushed so a crash loses at most one."""
+
+    def __init__(self, path: str):
+        # The torn record was never counted as done (see load_checkpoint), so it is simply run again
+        _truncate_torn_line(path)
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class ContextCache:
+    """Bounded LRU of anonymized contexts, scoped to one run_batch call (entries hold PII)."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: str, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _batches(items: Iterator[BatchItem], size: int) -> Iterator[List[BatchItem]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batch(
+    items: Iterator[BatchItem],
+    out_path: str,
+    pipelines: Dict[str, object],
+    concurrency: int = 4,
+    batch_size: int = 32,
+    rpm: float = 0,
+    retry_errors: bool = False,
+    gateway=None,
+    min_headroom: float = 0.1,
+) -> Dict[str, int]:
+    """Run items through `pipelines` ({"sla": ..., "kb": ...}) and stream results to `out_path`."""
+    done = load_checkpoint(out_path, retry_errors)
+    writer = JsonlWriter(out_path)
+    pacer = RatePacer(rpm)
+    counts = {"ok": 0, "error": 0, "skipped": 0, "duplicate": 0}
+    counts_lock = threading.Lock()
+    # Bound queued work so a huge input file is not materialised as futures all at once
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    context_cache = ContextCache()
+
+    def answer(item: BatchItem, docs, needs_llm: bool):
+        started = time.monotonic()
+        record = {"id": item.id, "pipeline": item.pipeline, "question": item.question}
+        try:
+            if needs_llm:
+                # Pace only calls that reach Azure OpenAI; SLA fast-path answers are local
+                if gateway is not None:
+                    gateway.wait_for_capacity("chat", min_headroom=min_headroom)
+                pacer.wait()
+            record["answer"] = pipelines[item.pipeline].run(
+                item.question, retrieved_docs=docs, context_cache=context_cache
+            )
+            record["error"] = None
+        except Exception as e:
+            record["answer"] = None
+            record["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            slots.release()
+        record["seconds"] = round(time.monotonic() - started, 3)
+        writer.write(record)
+        with counts_lock:
+            counts["error" if record["error"] else "ok"] += 1
+            if (counts["ok"] + counts["error"]) % PROGRESS_EVERY == 0:
+                print(f"[batch] ok={counts['ok']} error={counts['error']} skipped={counts['skipped']} "
+                      f"duplicate={counts['duplicate']}")
+
+    seen = set()
+
+    def pending():
+        for item in items:
+            if item.id in done:
+                counts["skipped"] += 1
+            elif item.id in seen:
+                # same id twice in the input: answered once, reported in the summary
+                counts["duplicate"] += 1
+            else:
+                seen.add(item.id)
+                yield item
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for batch in _batches(pending(), batch_size):
+                by_pipeline: Dict[str, List[BatchItem]] = {}
+                for item in batch:
+                    by_pipeline.setdefault(item.pipeline, []).append(item)
+                for name, group in by_pipeline.items():
+                    if name not in pipelines:
+                        for item in group:
+                            writer.write({"id": item.id, "pipeline": name, "question": item.question,
+                                          "answer": None, "error": f"Unknown pipeline: {name}", "seconds": 0})
+                        with counts_lock:
+                            counts["error"] += len(group)
+                        continue
+                    try:
+                        # One embeddings call + shared searches for the whole group;
+                        # None means the SLA fast path will answer without retrieval
+                        docs_list = pipelines[name].retrieve_many([i.question for i in group])
+                        needs_llm = [docs is not None for docs in docs_list]
+                    except Exception as e:
+                        print(f"[warn] batch retrieval failed ({e}); retrieving per item")
+                        docs_list, needs_llm = [None] * len(group), [True] * len(group)
+                    for item, docs, llm in zip(group, docs_list, needs_llm):
+                        slots.acquire()
+                        executor.submit(answer, item, docs, llm)
+    finally:
+        writer.close()
+        context_cache.clear()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run questions / ticket ids through the RAG pipelines in bulk.")
+    parser.add_argument("input", help=".txt (one question or ticket id per line) or .jsonl file")
+    parser.add_argument("--out", required=True, help="JSONL output file (also the resume checkpoint)")
+    parser.add_argument("--pipeline", choices=["sla", "kb"], default="sla", help="default pipeline (default sla)")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, help="question template for bare ticket ids")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel LLM calls (default 4)")
+    parser.add_argument("--batch-size", type=int, default=32, help="items retrieved per embeddings call")
+    parser.add_argument("--rpm", type=float, default=0, help="max LLM requests per minute (0 = no cap)")
+    parser.add_argument("--min-headroom", type=float, default=0.1,
+                        help="wait while every deployment has less than this fraction of TPM left")
+    parser.add_argument("--retry-errors", action="store_true", help="re-run items that failed previously")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    from multiple_data_processing import initialize_kb_rag_pipeline, initialize_sla_rag_pipeline
+    from openai_gateway import get_gateway
+
+    items = list(read_items(args.input, args.pipeline, args.template))
+    needed = {i.pipeline for i in items}
+    factories = {"sla": initialize_sla_rag_pipeline, "kb": initialize_kb_rag_pipeline}
+    pipelines = {name: factories[name]() for name in needed if name in factories}
+
+    started = time.monotonic()
+    counts = run_batch(
+        iter(items),
+        args.out,
+        pipelines,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        rpm=args.rpm,
+        retry_errors=args.retry_errors,
+        gateway=get_gateway(),
+        min_headroom=args.min_headroom,
+    )
+    print(f"Done in {time.monotonic() - started:.1f}s: {counts['ok']} ok, {counts['error']} failed, "
+          f"{counts['skipped']} already done, {counts['duplicate']} duplicate ids in the input. Results: {args.out}")
+    if "sla" in pipelines:
+        print(f"SLA fast path: {pipelines['sla'].stats()}")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -51,6 +51,13 @@ def _ensure_pipelines():
         _kb_pipeline, _sla_pipeline = initialize_all_pipelines()
 
 
+def pipeline_stats():
+    """Serving counters (e.g. SLA fast-path ratio); empty until the pipelines are initialized."""
+    if _sla_pipeline is None:
+        return {}
+    return {"sla": _sla_pipeline.stats()}
+
+
 # Bot classes
 class KB_Bot(ActivityHandler):
     def __init__(self):
@@ -0,0 +1,477 @@
+"""
+Versioned Chroma indexes with background rebuilds and atomic blue/green swaps.
+
+Each index (``kb``, ``sla``) lives under ``backend/.indexes/<name>/``:
+
+    .indexes/sla/
+      v20261019-101500/      # one complete Chroma persist dir per build (has a READY marker)
+      v20261019-143000/
+      CURRENT                # name of the version being served (replaced atomically)
+      PREVIOUS               # the version served before the last switch (always retained)
+      ROLLED_BACK            # versions that were rolled back from (pruned first)
+
+A rebuild writes a new version directory in a background thread while the current version keeps
+serving. Once the new store is persisted it is marked READY, CURRENT is switched with an atomic
+``os.replace`` and the in-process pipelines pick it up on their next query. Other processes
+serving the same index notice the CURRENT change and reload too, so a rebuild or rollback
+started from the CLI hot-reloads a running bot. Older versions are kept for rollback and pruned
+down to ``INDEX_KEEP_VERSIONS``; the previously served version is always kept, and versions that
+were rolled back from do not count towards the retained ones, so a rollback target survives the
+next rebuild.
+
+Legacy ``backend/.chroma_kb`` / ``.chroma_sla`` stores are still served until the first rebuild.
+An index can lay out its version directory itself (``build_store`` / ``open_store``); the SLA
+index uses this for its time-partitioned shards (see sla_shards.py).
+
+CLI (from the backend folder):
+  python index_manager.py list [kb|sla]
+  python index_manager.py rebuild [kb|sla|all]
+  python index_manager.py rollback sla [VERSION]     # default: the version before CURRENT
+  python index_manager.py cleanup [kb|sla|all]
+
+Env:
+  INDEX_KEEP_VERSIONS          versions to retain per index, including CURRENT (default 3)
+  INDEX_RELOAD_CHECK_SECONDS   how often a serving process checks CURRENT (default 5)
+  INDEX_WATCH                  true to rebuild automatically when files in data/ change
+  INDEX_WATCH_INTERVAL         seconds between data folder scans (default 30)
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INDEX_ROOT = os.path.join(HERE, ".indexes")
+
+READY_MARKER = "READY"
+CURRENT_FILE = "CURRENT"
+PREVIOUS_FILE = "PREVIOUS"
+ROLLED_BACK_FILE = "ROLLED_BACK"
+# Unfinished build directories older than this are assumed abandoned (crashed process)
+STALE_BUILD_SECONDS = 6 * 3600
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class IndexManager:
+    """Serves one versioned Chroma index and rebuilds it in the background on request."""
+
+    def __init__(
+        self,
+        name: str,
+        build_documents: Callable[[], List[str]],
+        embeddings,
+        legacy_dir: str | None = None,
+        root: str = INDEX_ROOT,
+        batch_size: int = 50,
+        write_artifacts: Callable[[str], None] | None = None,
+        build_store: Callable[[str, object, Optional[str]], int] | None = None,
+        open_store: Callable[[str, object], object] | None = None,
+    ):
+        self.name = name
+        self.build_documents = build_documents
+        # Optional hook that writes extra files (e.g. a ticket table) into a version dir before it is READY
+        self.write_artifacts = write_artifacts
+        # Optional custom layout: build_store(version_dir, embeddings, previous_version_dir) -> chunk count,
+        # open_store(persist_dir, embeddings) -> store, or None to open the dir as a plain Chroma store
+        self.build_store = build_store
+        self.open_store = open_store
+        self.embeddings = embeddings
+        self.legacy_dir = legacy_dir
+        self.root = os.path.join(root, name)
+        self.batch_size = batch_size
+        self.keep_versions = _env_int("INDEX_KEEP_VERSIONS", 3)
+        self.reload_check_seconds = _env_int("INDEX_RELOAD_CHECK_SECONDS", 5)
+
+        self._store = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._build_thread: Optional[threading.Thread] = None
+        self._building_version: Optional[str] = None
+        self._last_reload_check = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    # ----- version bookkeeping -----
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def _is_ready(self, version: str) -> bool:
+        return os.path.exists(os.path.join(self._version_dir(version), READY_MARKER))
+
+    def list_versions(self) -> List[str]:
+        """Complete versions, oldest first (version names sort chronologically)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            v for v in os.listdir(self.root)
+            if os.path.isdir(self._version_dir(v)) and self._is_ready(v)
+        )
+
+    def _read_pointer(self, filename: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, filename), encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and self._is_ready(version) else None
+
+    def _write_pointer(self, filename: str, content: str):
+        # Write-then-rename so readers only ever see the old or the new pointer
+        tmp = os.path.join(self.root, f"{filename}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.root, filename))
+
+    def current_version(self) -> Optional[str]:
+        return self._read_pointer(CURRENT_FILE)
+
+    def previous_version(self) -> Optional[str]:
+        return self._read_pointer(PREVIOUS_FILE)
+
+    def _rolled_back(self) -> List[str]:
+        try:
+            with open(os.path.join(self.root, ROLLED_BACK_FILE), encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _set_current(self, version: str):
+        previous = self.current_version()
+        if previous and previous != version:
+            self._write_pointer(PREVIOUS_FILE, previous)
+        self._write_pointer(CURRENT_FILE, version)
+
+    def _new_version_name(self) -> str:
+        base = time.strftime("v%Y%m%d-%H%M%S")
+        version, n = base, 1
+        while os.path.exists(self._version_dir(version)):
+            version = f"{base}-{n}"
+            n += 1
+        return version
+
+    def _open(self, persist_dir: str):
+        if self.open_store is not None:
+            store = self.open_store(persist_dir, self.embeddings)
+            if store is not None:
+                return store
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(embedding_function=self.embeddings, persist_directory=persist_dir)
+
+    # ----- serving -----
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def artifact_path(self, filename: str) -> Optional[str]:
+        """Path of a file written by `write_artifacts` for the served version (None for legacy stores)."""
+        version = self._version
+        if version is None or version == "legacy":
+            return None
+        return os.path.join(self._version_dir(version), filename)
+
+    def refresh(self):
+        """Switch to CURRENT if it moved (e.g. a rebuild or rollback from another process); throttled."""
+        now = time.monotonic()
+        if now - self._last_reload_check >= self.reload_check_seconds:
+            self._last_reload_check = now
+            current = self.current_version()
+            if current and current != self._version:
+                self._activate(current)
+
+    @property
+    def store(self):
+        """The vectorstore to query right now."""
+        self.refresh()
+        return self._store
+
+    def _activate(self, version: str, store=None):
+        store = store if store is not None else self._open(self._version_dir(version))
+        with self._lock:
+            previous = self._version
+            self._store, self._version = store, version
+        if previous != version:
+            print(f"[index:{self.name}] serving version {version} (was {previous})")
+
+    def ensure_ready(self):
+        """Open the current version; fall back to the legacy store; build synchronously if neither exists."""
+        if self._store is not None:
+            return
+        current = self.current_version()
+        if current:
+            print(f"Loading persisted {self.name.upper()} vectorstore {current}...")
+            self._activate(current)
+        elif self.legacy_dir and os.path.exists(self.legacy_dir):
+            print(f"Loading persisted {self.name.upper()} vectorstore (legacy {self.legacy_dir})...")
+            self._activate("legacy", self._open(self.legacy_dir))
+        else:
+            print(f"Creating new {self.name.upper()} vectorstore and persisting...")
+            self.rebuild(wait=True)
+            if self._store is None:
+                raise RuntimeError(f"Building the {self.name} index failed; see the log above")
+
+    # ----- building -----
+    def is_building(self) -> bool:
+        return self._build_thread is not None and self._build_thread.is_alive()
+
+    def rebuild(self, wait: bool = False) -> bool:
+        """Start a background build of a new version. Returns False if one is already running."""
+        with self._lock:
+            if self.is_building():
+                print(f"[index:{self.name}] rebuild already in progress ({self._building_version})")
+                return False
+            self._building_version = self._new_version_name()
+            os.makedirs(self._version_dir(self._building_version))
+            self._build_thread = threading.Thread(
+                target=self._build, args=(self._building_version,), name=f"index-build-{self.name}", daemon=True
+            )
+            self._build_thread.start()
+        if wait:
+            self._build_thread.join()
+        return True
+
+    def _build(self, version: str):
+        started = time.monotonic()
+        try:
+            if self.build_store is not None:
+                previous = self.current_version()
+                n_chunks = self.build_store(
+                    self._version_dir(version), self.embeddings, self._version_dir(previous) if previous else None
+                )
+                store = self._open(self._version_dir(version))
+            else:
+                documents = self.build_documents()
+                n_chunks = len(documents)
+                store = self._open(self._version_dir(version))
+                for i in range(0, len(documents), self.batch_size):
+                    batch = documents[i : i + self.batch_size]
+                    if batch:
+                        store.add_texts(batch)
+                store.persist()
+            if self.write_artifacts is not None:
+                self.write_artifacts(self._version_dir(version))
+            with open(os.path.join(self._version_dir(version), READY_MARKER), "w", encoding="utf-8") as f:
+                f.write(f"{n_chunks} chunks in {time.monotonic() - started:.1f}s\n")
+            self._set_current(version)
+            self._activate(version, store)
+            print(f"[index:{self.name}] built {version}: {n_chunks} chunks in {time.monotonic() - started:.1f}s")
+            self.cleanup()
+        except Exception as e:
+            # The previous version keeps serving; drop the partial directory unless the switch already happened
+            print(f"[index:{self.name}] rebuild {version} failed: {e}")
+            if version != self.current_version() and not self._is_ready(version):
+                shutil.rmtree(self._version_dir(version), ignore_errors=True)
+        finally:
+            self._building_version = None
+
+    # ----- rollback / retention -----
+    def rollback(self, version: str | None = None) -> str:
+        """Point CURRENT at `version` (default: the ready version just before CURRENT)."""
+        versions = self.list_versions()
+        if version is None:
+            current = self.current_version()
+            older = [v for v in versions if current is None or v < current]
+            if not older:
+                raise ValueError(f"No older {self.name} version to roll back to")
+            version = older[-1]
+        elif version not in versions:
+            raise ValueError(f"Unknown or incomplete {self.name} version: {version}")
+        current = self.current_version()
+        rolled_back = [v for v in self._rolled_back() if v != version]
+        if current and current != version and current not in rolled_back:
+            rolled_back.append(current)
+        self._write_pointer(ROLLED_BACK_FILE, "".join(f"{v}\n" for v in rolled_back))
+        self._set_current(version)
+        self._activate(version)
+        return version
+
+    def cleanup(self) -> List[str]:
+        """Delete all but the newest `keep_versions` ready versions, plus abandoned partial builds.
+
+        CURRENT and PREVIOUS are always kept; versions that were rolled back from are not counted
+        among the newest, so they are pruned before a known-good rollback target.
+        """
+        current = self.current_version()
+        rolled_back = set(self._rolled_back())
+        ranked = [v for v in self.list_versions() if v not in rolled_back]
+        keep = set(ranked[-max(self.keep_versions, 1):])
+        keep.update(v for v in (current, self.previous_version(), self._version, self._building_version) if v)
+
+        removed = []
+        now = time.time()
+        for entry in os.listdir(self.root):
+            path = self._version_dir(entry)
+            if not os.path.isdir(path) or entry in keep:
+                continue
+            if not self._is_ready(entry) and now - os.path.getmtime(path) < STALE_BUILD_SECONDS:
+                continue  # probably a build running in another process
+            # Chroma may still hold files open on Windows; a failed delete is retried next cleanup
+            shutil.rmtree(path, ignore_errors=True)
+            if not os.path.exists(path):
+                removed.append(entry)
+        if removed:
+            print(f"[index:{self.name}] removed old versions: {', '.join(removed)}")
+            remaining = [v for v in self._rolled_back() if v not in removed]
+            self._write_pointer(ROLLED_BACK_FILE, "".join(f"{v}\n" for v in remaining))
+        return removed
+
+
+# ===== Data folder watcher =====
+def _folder_fingerprint(folder: str) -> tuple:
+    entries = []
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return ()
+    for fname in names:
+        if fname.startswith("~$"):  # Excel lock/temp files
+            continue
+        path = os.path.join(folder, fname)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((fname, st.st_size, int(st.st_mtime)))
+    return tuple(entries)
+
+
+class DataWatcher:
+    """Polls data folders and triggers a rebuild of the matching index when their files change.
+
+    A change must be stable for one extra scan before the rebuild starts, so a large file that is
+    still being copied does not trigger a build of a half-written export.
+    """
+
+    def __init__(self, targets: Dict[str, IndexManager], interval: float = 30.0):
+        self.targets = targets
+        self.interval = interval
+        self._seen = {folder: _folder_fingerprint(folder) for folder in targets}
+        self._pending: Dict[str, tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="index-data-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        for folder, manager in self.targets.items():
+            fingerprint = _folder_fingerprint(folder)
+            if fingerprint == self._seen[folder]:
+                self._pending.pop(folder, None)
+                continue
+            if self._pending.get(folder) != fingerprint:
+                self._pending[folder] = fingerprint  # wait one more scan for the copy to settle
+                continue
+            print(f"[watcher] change detected in {folder}; rebuilding {manager.name} index")
+            if manager.rebuild():
+                self._seen[folder] = fingerprint
+                self._pending.pop(folder, None)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[watcher] scan failed: {e}")
+
+
+# ===== Registry =====
+_managers: Dict[str, IndexManager] = {}
+_managers_lock = threading.Lock()
+_watcher: Optional[DataWatcher] = None
+
+
+def get_index_manager(
+    name: str,
+    build_documents,
+    embeddings,
+    legacy_dir: str | None = None,
+    write_artifacts=None,
+    build_store=None,
+    open_store=None,
+) -> IndexManager:
+    """One manager per index per process, so every pipeline sees the same swaps."""
+    with _managers_lock:
+        manager = _managers.get(name)
+        if manager is None:
+            manager = IndexManager(
+                name,
+                build_documents,
+                embeddings,
+                legacy_dir=legacy_dir,
+                write_artifacts=write_artifacts,
+                build_store=build_store,
+                open_store=open_store,
+            )
+            _managers[name] = manager
+        return manager
+
+
+def start_data_watcher(folders: Dict[str, str]) -> Optional[DataWatcher]:
+    """Start the watcher if INDEX_WATCH=true. `folders` maps index name -> data folder."""
+    global _watcher
+    if os.getenv("INDEX_WATCH", "false").lower() != "true":
+        return None
+    with _managers_lock:
+        if _watcher is None:
+            targets = {folder: _managers[name] for name, folder in folders.items() if name in _managers}
+            _watcher = DataWatcher(targets, interval=float(os.getenv("INDEX_WATCH_INTERVAL", "30")))
+            _watcher.start()
+            print(f"[watcher] watching {', '.join(targets)} every {_watcher.interval:.0f}s")
+    return _watcher
+
+
+# ===== CLI =====
+def _cli_managers(which: str) -> List[IndexManager]:
+    sys.path.insert(0, HERE)
+    from multiple_data_processing import get_kb_index, get_sla_index
+
+    factories = {"kb": get_kb_index, "sla": get_sla_index}
+    names = list(factories) if which == "all" else [which]
+    return [factories[n]() for n in names]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage versioned KB/SLA indexes.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for cmd in ("list", "rebuild", "cleanup"):
+        p = sub.add_parser(cmd)
+        p.add_argument("index", nargs="?", default="all", choices=["kb", "sla", "all"])
+    p = sub.add_parser("rollback")
+    p.add_argument("index", choices=["kb", "sla"])
+    p.add_argument("version", nargs="?")
+    args = parser.parse_args(argv)
+
+    for manager in _cli_managers(args.index):
+        if args.command == "list":
+            current = manager.current_version()
+            print(f"{manager.name}:")
+            for v in manager.list_versions():
+                print(f"  {'*' if v == current else ' '} {v}")
+        elif args.command == "rebuild":
+            manager.rebuild(wait=True)
+        elif args.command == "rollback":
+            print(f"{manager.name}: CURRENT -> {manager.rollback(args.version)}")
+        elif args.command == "cleanup":
+            manager.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 
 from flask import Flask, request, jsonify
 from botbuilder.schema import Activity
-from bot_handler import sla_bot, kb_bot, sla_adapter, kb_adapter
+from bot_handler import sla_bot, kb_bot, sla_adapter, kb_adapter, pipeline_stats
 from dotenv import load_dotenv
 import asyncio
 import os
@@ -49,6 +49,11 @@ def kb_messages():
 
     return asyncio.run(process())
 
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    # Aggregate counters only (no message content or PII)
+    return jsonify(pipeline_stats())
+
 @app.route("/", methods=["GET"])
 def health_check():
     return jsonify({"status": "RAG Teams Bot is running!"})
@@ -1,20 +1,19 @@
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_core.messages import HumanMessage
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from llama_index.core import SimpleDirectoryReader  # keep only if you use it
-import pandas as pd
 import os
 import glob
 from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-
-# PII anonymization
-from presidio_analyzer import AnalyzerEngine, RecognizerResult
-from presidio_anonymizer import AnonymizerEngine
+from openai_gateway import get_gateway
+from index_manager import get_index_manager, start_data_watcher
+from pii_engine import compile_pattern, engine_from_env
+from ticket_fast_path import TICKET_ID_REGEX, TicketFastPath, build_ticket_table, save_ticket_table
+from sla_shards import build_sharded_store, open_sharded_store, sharding_enabled
 from typing import Tuple, Dict, Any
 import re
 
+# Heavy dependencies (LangChain/Chroma, llama_index, pandas, Presidio/spaCy) are imported
+# inside the functions that need them, so importing this module stays cheap and serving
+# from an already-built index never loads the ingestion-only libraries.
+# Run `python startup_profile.py` to see what each import / init phase costs.
 _here_dir = os.path.dirname(__file__)
 # Load the .env located in the backend directory explicitly so scripts launched from the repo root
 # still pick up the Azure/OpenAI credentials stored in backend/.env
@@ -29,6 +28,12 @@ azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 PRESIDIO_LANGUAGE = os.getenv("PRESIDIO_LANGUAGE", "en")
 # Whether to restore PII values into the final response (boolean env var: RESTORE_PII)
 RESTORE_PII = os.getenv("RESTORE_PII", "true").lower() not in ("false", "0")
+# Chunking and retrieval depth; troubleshooting/retrieval_eval.py sweeps these on a labelled query set
+KB_CHUNK_SIZE = int(os.getenv("KB_CHUNK_SIZE", "1000"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "200"))
+SLA_CHUNK_SIZE = int(os.getenv("SLA_CHUNK_SIZE", "512"))
+SLA_CHUNK_OVERLAP = int(os.getenv("SLA_CHUNK_OVERLAP", "200"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "10"))
 
 # Folders
 HERE = os.path.dirname(__file__)
@@ -60,6 +65,17 @@ def get_anonymizer():
         _anonymizer = AnonymizerEngine()
     return _anonymizer
 
+
+# Tiered detection: compiled pattern recognizers first, spaCy NER only on segments that
+# might contain names (see pii_engine.py; PII_ENGINE=presidio restores the full analyzer).
+_pii_engine = None
+
+def get_pii_engine():
+    global _pii_engine
+    if _pii_engine is None:
+        _pii_engine = engine_from_env(get_analyzer)
+    return _pii_engine
+
 def anonymize_text(
     text: str,
     language: str = PRESIDIO_LANGUAGE,
@@ -81,19 +97,22 @@ def anonymize_text(
     placeholder_prefix = "__PRESERVED__"
     working_text = text
     if preserve_regex:
-        matches = re.findall(preserve_regex, text)
+        matches = compile_pattern(preserve_regex).findall(text)
         for i, m in enumerate(matches):
             ph = f"{placeholder_prefix}{i}__"
             preserved.append((ph, m))
             working_text = working_text.replace(m, ph)
 
-    results: list[RecognizerResult] = get_analyzer().analyze(text=working_text, language=language)
-    if not results:
+    spans = get_pii_engine().analyze(working_text, language=language)
+    if not spans:
         # restore preserved tokens if any
         for ph, orig in preserved:
             working_text = working_text.replace(ph, orig)
         return working_text
 
+    from presidio_analyzer import RecognizerResult
+
+    results = [RecognizerResult(sp.entity_type, sp.start, sp.end, sp.score) for sp in spans]
     anonymized = get_anonymizer().anonymize(text=working_text, analyzer_results=results).text
 
     # restore preserved tokens
@@ -155,23 +174,22 @@ def anonymize_and_map(
     working_text = text
     placeholder_prefix = "__PRESERVED__"
     if preserve_regex:
-        matches = re.findall(preserve_regex, text)
+        matches = compile_pattern(preserve_regex).findall(text)
         for i, m in enumerate(matches):
             ph = f"{placeholder_prefix}{i}__"
             preserved.append((ph, m))
             working_text = working_text.replace(m, ph)
 
-    # Analyze using Presidio to detect PII spans
-    results: list[RecognizerResult] = get_analyzer().analyze(text=working_text, language=language)
-    if not results:
+    # Detect PII spans (non-overlapping, sorted by start)
+    spans = get_pii_engine().analyze(working_text, language=language)
+    if not spans:
         # nothing to anonymize; restore preserved tokens and return empty mapping
         for ph, orig in preserved:
             working_text = working_text.replace(ph, orig)
         preserved_map = {ph: orig for ph, orig in preserved}
         return working_text, {}, preserved_map
 
-    # Build mapping and replace spans with placeholders. Sort by start to avoid offset shifts.
-    spans = sorted(results, key=lambda r: r.start)
+    # Build mapping and replace spans with placeholders, walking them in start order.
     mapping: Dict[str, str] = {}
     anonymized = []
     last_idx = 0
@@ -234,36 +252,26 @@ def _inject_ticket_into_response(response_text: str, ticket_id: str) -> str:
     return new_text
 
 # ===== Embeddings =====
+# Both pipelines share one gateway (pooled connections + multi-deployment routing/failover).
+# See openai_gateway.py for the AZURE_OPENAI_*_DEPLOYMENTS settings.
 def initialize_embeddings():
-    return AzureOpenAIEmbeddings(
-        # IMPORTANT: use azure_deployment for langchain_openai 0.3.x
-        azure_deployment=azure_embeddings_deployment_name,
-        model=os.getenv("AZURE_OPENAI_EMBEDDINGS_MODEL_NAME", "text-embedding-3-large"),
-        api_key=azure_api_key,
-        azure_endpoint=azure_endpoint,
-        openai_api_version=azure_openai_api_version,
-        chunk_size=512,
-    )
+    return get_gateway().embeddings()
 
 # ===== LLM =====
 def initialize_llm():
-    return AzureChatOpenAI(
-        # IMPORTANT: use azure_deployment for langchain_openai 0.3.x
-        azure_deployment=azure_deployment_name,
-        api_key=azure_api_key,
-        azure_endpoint=azure_endpoint,
-        openai_api_version=azure_openai_api_version,
-    )
+    return get_gateway().chat_model()
 
 # ===== Data loading helpers =====
 def read_pdf(file_path: str):
+    from llama_index.core import SimpleDirectoryReader
+
     try:
         return SimpleDirectoryReader(input_files=[file_path]).load_data()
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         return []
 
-def load_kb_data():
+def read_kb_documents():
     file_paths = glob.glob(f"{PDF_FOLDER_PATH}/*.pdf")
     all_documents = []
     if not file_paths:
@@ -272,24 +280,62 @@ def load_kb_data():
         results = executor.map(read_pdf, file_paths)
         for docs in results:
             all_documents.extend(docs)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return all_documents
+
+def split_kb_documents(documents, chunk_size: int = KB_CHUNK_SIZE, chunk_overlap: int = KB_CHUNK_OVERLAP):
+    """Split PDF pages into (text, {"source", "page"}) chunks."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     chunks = []
-    for doc in all_documents:
+    for doc in documents:
         try:
             # SimpleDirectoryReader returns nodes with .text
-            chunks.extend(text_splitter.split_text(doc.text or ""))
+            metadata = {
+                "source": (doc.metadata or {}).get("file_name", ""),
+                "page": str((doc.metadata or {}).get("page_label", "")),
+            }
+            chunks.extend((text, metadata) for text in text_splitter.split_text(doc.text or ""))
         except Exception as e:
             print(f"Split error on doc: {e}")
     return chunks
 
-def _read_excel_rows(file_path: str):
+def load_kb_data():
+    return [text for text, _ in split_kb_documents(read_kb_documents())]
+
+def _read_excel_records(file_path: str):
+    import pandas as pd
+
     try:
         df = pd.read_excel(file_path, engine="openpyxl")
-        return df.astype(str).apply(" ".join, axis=1).tolist()
+        return df.astype(str).to_dict(orient="records")
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         return []
 
+def _read_excel_rows(file_path: str):
+    return [" ".join(str(v) for v in record.values()) for record in _read_excel_records(file_path)]
+
+def load_sla_records():
+    file_paths = glob.glob(f"{EXCEL_FOLDER_PATH}/*.xlsx")
+    if not file_paths:
+        print(f"[warn] No Excel files found under {EXCEL_FOLDER_PATH}.")
+    with ThreadPoolExecutor() as executor:
+        all_records = list(executor.map(_read_excel_records, file_paths))
+    return [r for records in all_records for r in records]
+
+def write_sla_ticket_table(version_dir: str, records):
+    """Write the ticket-id -> row table used by the SLA fast path next to an index version."""
+    table = build_ticket_table(records)
+    save_ticket_table(table, version_dir)
+    print(f"SLA ticket table written: {len(table)} tickets.")
+
+def split_sla_rows(rows, chunk_size: int = SLA_CHUNK_SIZE, chunk_overlap: int = SLA_CHUNK_OVERLAP):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_text("\n".join(rows))
+
 def load_sla_data():
     file_paths = glob.glob(f"{EXCEL_FOLDER_PATH}/*.xlsx")
     if not file_paths:
@@ -297,50 +343,140 @@ def load_sla_data():
     with ThreadPoolExecutor() as executor:
         all_rows_lists = list(executor.map(_read_excel_rows, file_paths))
     flat_rows = [row for rows in all_rows_lists for row in rows]
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=200)
-    return text_splitter.split_text("\n".join(flat_rows))
+    return split_sla_rows(flat_rows)
+
+# ===== Versioned indexes =====
+# Both indexes are served from versioned directories and can be rebuilt in the background
+# with an atomic swap (see index_manager.py). The old .chroma_kb/.chroma_sla stores are still
+# served until the first versioned build exists.
+def get_kb_index():
+    return get_index_manager(
+        "kb", load_kb_data, initialize_embeddings(), legacy_dir=os.path.join(HERE, ".chroma_kb")
+    )
 
-def batch_documents(documents, batch_size, vectorstore):
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i : i + batch_size]
-        if batch:
-            vectorstore.add_texts(batch)
+
+def build_sla_version(version_dir: str, embeddings, previous_dir=None):
+    """Build one SLA version from a single read of the workbooks, so the index and the fast-path
+    ticket table always describe the same rows."""
+    records = load_sla_records()
+    if sharding_enabled():
+        # Month/quarter shards; unchanged shards are copied from previous_dir
+        n_chunks = build_sharded_store(
+            version_dir,
+            embeddings,
+            records,
+            previous_dir=previous_dir,
+            chunk_size=SLA_CHUNK_SIZE,
+            chunk_overlap=SLA_CHUNK_OVERLAP,
+        )
+    else:
+        from langchain_community.vectorstores import Chroma
+
+        chunks = split_sla_rows([" ".join(str(v) for v in r.values()) for r in records])
+        store = Chroma(embedding_function=embeddings, persist_directory=version_dir)
+        for i in range(0, len(chunks), 50):
+            store.add_texts(chunks[i : i + 50])
+        store.persist()
+        n_chunks = len(chunks)
+    write_sla_ticket_table(version_dir, records)
+    return n_chunks
+
+
+def get_sla_index():
+    # With SLA_SHARDING=false new versions are built as one flat store; sharded versions that
+    # are already on disk (e.g. for rollback) are still opened as shards.
+    return get_index_manager(
+        "sla",
+        load_sla_data,
+        initialize_embeddings(),
+        legacy_dir=os.path.join(HERE, ".chroma_sla"),
+        build_store=build_sla_version,
+        open_store=open_sharded_store,
+    )
+
+
+def rebuild_indexes(wait: bool = False):
+    """Rebuild both indexes in the background; serving switches over when each build completes."""
+    get_kb_index().rebuild(wait=wait)
+    get_sla_index().rebuild(wait=wait)
+
+# ===== Shared retrieval / anonymization helpers =====
+def _retrieval_query(user_message: str) -> str:
+    """Prefer the exact ticket id for retrieval; fall back to the raw user message."""
+    ticket_match = re.search(TICKET_ID_REGEX, user_message, re.IGNORECASE)
+    return ticket_match.group(0) if ticket_match else user_message
+
+
+def similarity_search(store, query: str, k: int = 10, time_hint: str | None = None):
+    """Search `store`; a sharded SLA store also uses `time_hint` (the full question) to pick shards."""
+    if time_hint is not None and getattr(store, "supports_time_hint", False):
+        return store.similarity_search(query, k=k, time_hint=time_hint)
+    return store.similarity_search(query, k=k)
+
+
+def retrieve_many(index, queries, k: int = 10, time_hints=None):
+    """Retrieve for many queries with one embeddings call; identical queries are searched once."""
+    hints = time_hints if time_hints is not None else [None] * len(queries)
+    unique = list(dict.fromkeys(queries))
+    if not unique:
+        return []
+    vectors = dict(zip(unique, index.embeddings.embed_documents(unique)))
+    store = index.store
+    sharded = getattr(store, "supports_time_hint", False)
+    results = {}
+    for q, hint in zip(queries, hints):
+        key = (q, hint if sharded else None)
+        if key not in results:
+            if sharded and hint is not None:
+                results[key] = store.similarity_search_by_vector(vectors[q], k=k, time_hint=hint)
+            else:
+                results[key] = store.similarity_search_by_vector(vectors[q], k=k)
+    return [results[(q, hint if sharded else None)] for q, hint in zip(queries, hints)]
+
+
+def _anonymize_context(raw_context: str, context_cache=None):
+    """Anonymize retrieved context; batch runs pass a per-run `context_cache` so several
+    questions about the same ticket anonymize its context once. Interactive calls are not cached."""
+    if context_cache is None:
+        return anonymize_and_map(raw_context, preserve_regex=TICKET_ID_REGEX)
+    return context_cache.get_or_compute(
+        raw_context, lambda: anonymize_and_map(raw_context, preserve_regex=TICKET_ID_REGEX)
+    )
 
 # ===== Pipelines =====
 def initialize_kb_rag_pipeline():
-    embeddings = initialize_embeddings()
-    llm = initialize_llm()
-    persist_dir = os.path.join(HERE, ".chroma_kb")
+    from langchain_core.messages import HumanMessage
 
-    if os.path.exists(persist_dir):
-        print("Loading persisted KB vectorstore...")
-        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
-    else:
-        print("Creating new KB vectorstore and persisting...")
-        documents = load_kb_data()
-        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
-        batch_documents(documents, batch_size=50, vectorstore=vectorstore)
-        vectorstore.persist()
-        print("KB vectorstore persisted.")
+    llm = initialize_llm()
+    index = get_kb_index()
+    index.ensure_ready()
 
     class RAGPipeline:
-        def run(self, user_message: str):
+        def retrieve_many(self, user_messages):
+            """Batch retrieval for run(..., retrieved_docs=...); used by batch_runner.py."""
+            return retrieve_many(index, [_retrieval_query(m) for m in user_messages], k=RETRIEVAL_K)
+
+        def run(self, user_message: str, retrieved_docs=None, context_cache=None):
             # 1) Try to extract a ticket id from the user's question so we can use it for retrieval
-            ticket_match = re.search(r"\b(IN\d{4,7})\b", user_message, re.IGNORECASE)
-            ticket_id = ticket_match.group(1) if ticket_match else None
+            ticket_match = re.search(TICKET_ID_REGEX, user_message, re.IGNORECASE)
+            ticket_id = ticket_match.group(0) if ticket_match else None
 
             # 2) For retrieval prefer the exact ticket id if present; fall back to the raw user message.
             # Do NOT anonymize before retrieval because that can remove matching tokens; instead
             # preserve ticket ids when needed and search using the ticket id (if present).
             retrieval_query = ticket_id if ticket_id else user_message
-            results = vectorstore.similarity_search(retrieval_query, k=10)
+            if retrieved_docs is not None:
+                results = retrieved_docs
+            else:
+                # index.store is read per query so a completed rebuild is picked up without a restart
+                results = index.store.similarity_search(retrieval_query, k=RETRIEVAL_K)
 
             # 3) Build raw context from retrieved docs
             raw_context = " ".join([doc.page_content for doc in results])
 
             # 4) Anonymize context and question but keep a mapping of placeholders -> original PII
-            anon_context, context_map, preserved_map = anonymize_and_map(raw_context, preserve_regex=r"\bIN\d{4,7}\b")
-            anon_question, question_map, preserved_map_q = anonymize_and_map(user_message, preserve_regex=r"\bIN\d{4,7}\b")
+            anon_context, context_map, preserved_map = _anonymize_context(raw_context, context_cache)
+            anon_question, question_map, preserved_map_q = anonymize_and_map(user_message, preserve_regex=TICKET_ID_REGEX)
 
             # Merge mappings so we can restore all originals later
             combined_map = {**context_map, **question_map}
@@ -384,31 +520,43 @@ Answer:"""
     return RAGPipeline()
 
 def initialize_sla_rag_pipeline():
-    embeddings = initialize_embeddings()
-    llm = initialize_llm()
-    persist_dir = os.path.join(HERE, ".chroma_sla")
+    from langchain_core.messages import HumanMessage
 
-    if os.path.exists(persist_dir):
-        print("Loading persisted SLA vectorstore...")
-        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
-    else:
-        print("Creating new SLA vectorstore and persisting...")
-        documents = load_sla_data()
-        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
-        batch_documents(documents, batch_size=50, vectorstore=vectorstore)
-        vectorstore.persist()
-        print("SLA vectorstore persisted.")
+    llm = initialize_llm()
+    index = get_sla_index()
+    index.ensure_ready()
+    # Simple "status / assignee / last update of INxxxxxxx" questions are answered from the
+    # ingested row without any outbound call; with RESTORE_PII off the values are redacted locally.
+    fast_path = TicketFastPath(index, redact=None if RESTORE_PII else anonymize_text)
 
     class RAGPipeline:
-        def run(self, user_message: str):
+        def stats(self):
+            return fast_path.stats()
+
+        def retrieve_many(self, user_messages):
+            """Batch retrieval for run(..., retrieved_docs=...); fast-path questions get None."""
+            pending = [m for m in user_messages if not fast_path.can_answer(m)]
+            docs = dict(zip(pending, retrieve_many(
+                index, [_retrieval_query(m) for m in pending], k=RETRIEVAL_K, time_hints=pending
+            )))
+            return [docs.get(m) for m in user_messages]
+
+        def run(self, user_message: str, retrieved_docs=None, context_cache=None):
+            fast_answer = fast_path.try_answer(user_message)
+            if fast_answer is not None:
+                print(f"[info] Answered from ticket table (fast path ratio {fast_path.stats()['fast_path_ratio']:.0%})")
+                return fast_answer
+
             # 1) Try to extract a ticket id from the user's question so we can use it for retrieval
-            ticket_match = re.search(r"\b(IN\d{4,7})\b", user_message, re.IGNORECASE)
-            ticket_id = ticket_match.group(1) if ticket_match else None
+            ticket_match = re.search(TICKET_ID_REGEX, user_message, re.IGNORECASE)
+            ticket_id = ticket_match.group(0) if ticket_match else None
 
             # 2) For retrieval prefer the exact ticket id if present; fall back to the raw user message.
             # Do NOT anonymize before retrieval because that can remove matching tokens.
             retrieval_query = ticket_id if ticket_id else user_message
-            retrieved_docs = vectorstore.similarity_search(retrieval_query, k=10)
+            if retrieved_docs is None:
+                # The full question picks the SLA shards to search (ticket month, "last week", ...)
+                retrieved_docs = similarity_search(index.store, retrieval_query, k=RETRIEVAL_K, time_hint=user_message)
 
             # 3) Build raw context from retrieved docs
             if not retrieved_docs:
@@ -420,11 +568,9 @@ def initialize_sla_rag_pipeline():
 
             # 4) Anonymize context and question but capture mapping to originals
             # Anonymize context and question (preserve ticket id tokens)
-            anon_context, context_map, preserved_map = anonymize_and_map(
-                raw_context, preserve_regex=r"\bIN\d{4,7}\b"
-            )
+            anon_context, context_map, preserved_map = _anonymize_context(raw_context, context_cache)
             anon_question, question_map, preserved_map_q = anonymize_and_map(
-                user_message, preserve_regex=r"\bIN\d{4,7}\b"
+                user_message, preserve_regex=TICKET_ID_REGEX
             )
 
             combined_map = {**context_map, **question_map}
@@ -460,4 +606,6 @@ def initialize_all_pipelines():
         sla_future = executor.submit(initialize_sla_rag_pipeline)
         kb_pipeline = kb_future.result()
         sla_pipeline = sla_future.result()
+    # Optional: rebuild automatically when files under data/ change (INDEX_WATCH=true)
+    start_data_watcher({"kb": PDF_FOLDER_PATH, "sla": EXCEL_FOLDER_PATH})
     return kb_pipeline, sla_pipeline
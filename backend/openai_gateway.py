@@ -0,0 +1,424 @@
+"""
+Shared Azure OpenAI gateway used by both RAG pipelines.
+
+All chat and embedding calls go through one pooled keep-alive HTTP client and are spread
+across a configured list of deployments (one per region / quota bucket). Each request is
+routed to the deployment with the best latency / remaining-quota score; on 429, 5xx or a
+connection error the deployment is put on cooldown and the call fails over to the next one.
+
+Configuration (backend/.env):
+  AZURE_OPENAI_CHAT_DEPLOYMENTS        JSON list of deployments for chat completions
+  AZURE_OPENAI_EMBEDDINGS_DEPLOYMENTS  JSON list of deployments for embeddings
+      e.g. [{"endpoint": "https://weu.openai.azure.com", "deployment": "gpt-4.1", "tpm": 80000},
+            {"endpoint": "https://sec.openai.azure.com", "deployment": "gpt-4.1", "api_key": "..."}]
+      Missing keys fall back to AZURE_OPENAI_API_KEY / AZURE_OPENAI_API_VERSION. When the lists
+      are not set, the single AZURE_OPENAI_DEPLOYMENT_NAME / AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME
+      deployment on AZURE_OPENAI_ENDPOINT is used, so existing .env files keep working.
+  AZURE_OPENAI_POOL_MAX_CONNECTIONS    size of the shared connection pool (default 20)
+  AZURE_OPENAI_TIMEOUT                 per-request timeout in seconds (default 60)
+
+Note: every embeddings deployment in the list must serve the same embedding model, otherwise
+vectors written by one deployment cannot be compared with queries embedded by another.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Status codes that mean "try another deployment" rather than "the request itself is bad"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Auth / not-found errors are specific to one deployment's key, endpoint or name: fail over and keep
+# that deployment out of rotation for a long time instead of failing the request
+MISCONFIGURED_STATUS = {401, 403, 404}
+MISCONFIGURED_COOLDOWN_SECONDS = 300.0
+# Default cooldown when a deployment fails without telling us how long to back off
+DEFAULT_COOLDOWN_SECONDS = 10.0
+# Azure TPM quota is a rolling one-minute window
+QUOTA_WINDOW_SECONDS = 60.0
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+_DEPLOYMENT_PATH = re.compile(r"/openai/deployments/([^/]+)/")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _origin(scheme: str, host: str | None, port: int | None) -> tuple:
+    return ((host or "").lower(), port or _DEFAULT_PORTS.get(scheme))
+
+
+class GatewayError(RuntimeError):
+    """Raised when every configured deployment failed (or is cooling down) for a request."""
+
+
+class Deployment:
+    """One Azure OpenAI deployment plus the routing state the gateway keeps for it."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        deployment: str,
+        api_key: str | None = None,
+        api_version: str | None = None,
+        tpm: int | None = None,
+        model: str | None = None,
+    ):
+        self.endpoint = (endpoint or "").rstrip("/")
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.tpm = tpm
+        self.model = model
+        parts = urlsplit(self.endpoint)
+        self.origin = _origin(parts.scheme, parts.hostname, parts.port)
+
+        self.latency_ewma: float | None = None
+        self.remaining_tokens: int | None = None
+        self.remaining_requests: int | None = None
+        self.quota_updated_at = 0.0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        host = re.sub(r"^https?://", "", self.endpoint)
+        return f"{host}/{self.deployment}"
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def headroom(self, now: float) -> float:
+        """Fraction of the TPM quota believed to be left (1.0 when unknown or the window rolled)."""
+        if self.remaining_tokens is None or now - self.quota_updated_at > QUOTA_WINDOW_SECONDS:
+            return 1.0
+        if not self.tpm:
+            # Without a configured limit we can only tell "some" from "none"
+            return 1.0 if self.remaining_tokens > 0 else 0.0
+        return max(0.0, min(1.0, self.remaining_tokens / self.tpm))
+
+    def score(self, now: float) -> float:
+        """Lower is better: expected latency inflated by how close the deployment is to its quota."""
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return latency / max(self.headroom(now), 0.05)
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.requests += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = (
+                    LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+                )
+
+    def record_failure(self, cooldown: float):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    def record_headers(self, headers):
+        """Update quota state from the x-ratelimit-* headers Azure returns on every response."""
+        tokens = headers.get("x-ratelimit-remaining-tokens")
+        reqs = headers.get("x-ratelimit-remaining-requests")
+        with self._lock:
+            if tokens is not None and tokens.isdigit():
+                self.remaining_tokens = int(tokens)
+                self.quota_updated_at = time.monotonic()
+            if reqs is not None and reqs.isdigit():
+                self.remaining_requests = int(reqs)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "deployment": self.name,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma": self.latency_ewma,
+            "remaining_tokens": self.remaining_tokens,
+            "remaining_requests": self.remaining_requests,
+            "headroom": self.headroom(now),
+            "cooling_down": not self.is_available(now),
+        }
+
+
+def _retry_after_seconds(headers) -> float:
+    if headers is None:
+        return DEFAULT_COOLDOWN_SECONDS
+    for key, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(key)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return DEFAULT_COOLDOWN_SECONDS
+
+
+class AzureOpenAIGateway:
+    """Routes chat/embedding calls across deployments over one shared connection pool."""
+
+    def __init__(
+        self,
+        chat_deployments: List[Deployment],
+        embedding_deployments: List[Deployment],
+        max_connections: int = 20,
+        timeout: float = 60.0,
+        http_client=None,
+    ):
+        import httpx
+
+        self.chat_deployments = list(chat_deployments)
+        self.embedding_deployments = list(embedding_deployments)
+        self.http_client = http_client or httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+        # Quota headers are captured on the shared client, whichever SDK object made the call
+        hooks = self.http_client.event_hooks
+        hooks["response"] = list(hooks.get("response", [])) + [self._on_response]
+        self.http_client.event_hooks = hooks
+
+        self._clients: Dict[tuple, Any] = {}
+        self._clients_lock = threading.Lock()
+        self._rotation = 0
+
+    # ----- routing -----
+    def _candidates(self, deployments: List[Deployment]) -> List[Deployment]:
+        """Deployments ordered best-first; ones cooling down go last, soonest-available first."""
+        now = time.monotonic()
+        with self._clients_lock:
+            self._rotation += 1
+            offset = self._rotation % max(len(deployments), 1)
+        # Rotate before the stable sort so equally-scored deployments share the load
+        rotated = deployments[offset:] + deployments[:offset]
+        ready = sorted((d for d in rotated if d.is_available(now)), key=lambda d: d.score(now))
+        cooling = sorted((d for d in rotated if not d.is_available(now)), key=lambda d: d.cooldown_until)
+        return ready + cooling
+
+    def _on_response(self, response):
+        url = response.request.url
+        match = _DEPLOYMENT_PATH.search(url.path)
+        if not match:
+            return
+        origin = _origin(url.scheme, url.host, url.port)
+        for dep in self.chat_deployments + self.embedding_deployments:
+            if dep.deployment == match.group(1) and dep.origin == origin:
+                dep.record_headers(response.headers)
+
+    def _call(self, kind: str, deployments: List[Deployment], fn: Callable[[Any], Any]):
+        import openai
+
+        if not deployments:
+            raise GatewayError(f"No Azure OpenAI {kind} deployments are configured")
+
+        errors = []
+        last_error = None
+        for dep in self._candidates(deployments):
+            client = self._client_for(kind, dep)
+            started = time.monotonic()
+            try:
+                result = fn(client)
+            except openai.APIStatusError as e:
+                if e.status_code in MISCONFIGURED_STATUS:
+                    dep.record_failure(MISCONFIGURED_COOLDOWN_SECONDS)
+                    print(f"[gateway] {dep.name} returned HTTP {e.status_code}; check its key/endpoint/name. "
+                          f"Skipping it for {MISCONFIGURED_COOLDOWN_SECONDS:.0f}s")
+                elif e.status_code in RETRYABLE_STATUS:
+                    dep.record_failure(_retry_after_seconds(e.response.headers))
+                else:
+                    raise
+                errors.append(f"{dep.name}: HTTP {e.status_code}")
+                last_error = e
+                continue
+            except (openai.APIConnectionError, openai.APITimeoutError) as e:
+                dep.record_failure(DEFAULT_COOLDOWN_SECONDS)
+                errors.append(f"{dep.name}: {type(e).__name__}")
+                last_error = e
+                continue
+            dep.record_success(time.monotonic() - started)
+            return result
+
+        raise GatewayError(f"All {kind} deployments failed: " + "; ".join(errors)) from last_error
+
+    # ----- per-deployment SDK clients (all sharing self.http_client) -----
+    def _client_for(self, kind: str, dep: Deployment):
+        key = (kind, dep.endpoint, dep.deployment)
+        with self._clients_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._build_client(kind, dep)
+                self._clients[key] = client
+            return client
+
+    def _build_client(self, kind: str, dep: Deployment):
+        from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+        common = dict(
+            # IMPORTANT: use azure_deployment for langchain_openai 0.3.x
+            azure_deployment=dep.deployment,
+            api_key=dep.api_key,
+            azure_endpoint=dep.endpoint,
+            openai_api_version=dep.api_version,
+            http_client=self.http_client,
+            # Failover is handled here; SDK retries would just hammer a throttled deployment
+            max_retries=0,
+        )
+        if kind == "chat":
+            return AzureChatOpenAI(**common)
+        return AzureOpenAIEmbeddings(
+            model=_embeddings_model(dep),
+            chunk_size=512,
+            **common,
+        )
+
+    # ----- public surface -----
+    def invoke_chat(self, messages, **kwargs):
+        return self._call("chat", self.chat_deployments, lambda c: c.invoke(messages, **kwargs))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embeddings", self.embedding_deployments, lambda c: c.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("embeddings", self.embedding_deployments, lambda c: c.embed_query(text))
+
+    def chat_model(self) -> "GatewayChatModel":
+        return GatewayChatModel(self)
+
+    def embeddings(self):
+        return _gateway_embeddings_class()(self)
+
+    def wait_for_capacity(self, kind: str = "chat", min_headroom: float = 0.1, max_wait: float = 60.0) -> float:
+        """Block until a deployment is off cooldown with at least `min_headroom` of its TPM left.
+
+        Used by bulk callers to pace themselves instead of driving every deployment into 429s.
+        Returns the number of seconds waited (capped at `max_wait`).
+        """
+        deployments = self.chat_deployments if kind == "chat" else self.embedding_deployments
+        waited = 0.0
+        while deployments and waited < max_wait:
+            now = time.monotonic()
+            if any(d.is_available(now) and d.headroom(now) >= min_headroom for d in deployments):
+                break
+            soonest = min(d.cooldown_until for d in deployments)
+            delay = min(max(soonest - now, 0.2), 1.0, max_wait - waited)
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "chat": [d.stats() for d in self.chat_deployments],
+            "embeddings": [d.stats() for d in self.embedding_deployments],
+        }
+
+    def close(self):
+        self.http_client.close()
+
+
+class GatewayChatModel:
+    """Drop-in for the AzureChatOpenAI calls the pipelines make (`llm.invoke(messages)`)."""
+
+    def __init__(self, gateway: AzureOpenAIGateway):
+        self.gateway = gateway
+
+    def invoke(self, messages, **kwargs):
+        return self.gateway.invoke_chat(messages, **kwargs)
+
+
+_embeddings_cls = None
+
+
+def _embeddings_model(dep: Deployment) -> str:
+    return dep.model or os.getenv("AZURE_OPENAI_EMBEDDINGS_MODEL_NAME", "text-embedding-3-large")
+
+
+def _gateway_embeddings_class():
+    # Built lazily so importing this module does not pull in langchain_core
+    global _embeddings_cls
+    if _embeddings_cls is None:
+        from langchain_core.embeddings import Embeddings
+
+        class GatewayEmbeddings(Embeddings):
+            """LangChain Embeddings backed by the gateway, usable as a Chroma embedding_function."""
+
+            def __init__(self, gateway: AzureOpenAIGateway):
+                self.gateway = gateway
+
+            def embed_documents(self, texts: List[str]) -> List[List[float]]:
+                return self.gateway.embed_documents(texts)
+
+            def embed_query(self, text: str) -> List[float]:
+                return self.gateway.embed_query(text)
+
+            def identity(self) -> Dict[str, str]:
+                """Model and deployment names behind these vectors (recorded with built indexes)."""
+                deps = self.gateway.embedding_deployments
+                return {
+                    "model": ",".join(sorted({_embeddings_model(d) for d in deps})),
+                    "deployment": ",".join(sorted({d.deployment or "" for d in deps})),
+                }
+
+        _embeddings_cls = GatewayEmbeddings
+    return _embeddings_cls
+
+
+# ===== Configuration =====
+def _deployments_from_env(list_var: str, single_name_var: str) -> List[Deployment]:
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPENAI_API_BASE")
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION") or os.getenv("OPENAI_API_VERSION")
+
+    raw = os.getenv(list_var)
+    if not raw:
+        return [Deployment(endpoint, os.getenv(single_name_var), api_key, api_version)]
+
+    entries = json.loads(raw)
+    deployments = []
+    for entry in entries:
+        tpm = entry.get("tpm")
+        deployments.append(
+            Deployment(
+                endpoint=entry.get("endpoint") or endpoint,
+                deployment=entry["deployment"],
+                api_key=entry.get("api_key") or api_key,
+                api_version=entry.get("api_version") or api_version,
+                tpm=int(tpm) if tpm else None,
+                model=entry.get("model"),
+            )
+        )
+    return deployments
+
+
+def gateway_from_env() -> AzureOpenAIGateway:
+    return AzureOpenAIGateway(
+        chat_deployments=_deployments_from_env(
+            "AZURE_OPENAI_CHAT_DEPLOYMENTS", "AZURE_OPENAI_DEPLOYMENT_NAME"
+        ),
+        embedding_deployments=_deployments_from_env(
+            "AZURE_OPENAI_EMBEDDINGS_DEPLOYMENTS", "AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME"
+        ),
+        max_connections=int(os.getenv("AZURE_OPENAI_POOL_MAX_CONNECTIONS", "20")),
+        timeout=float(os.getenv("AZURE_OPENAI_TIMEOUT", "60")),
+    )
+
+
+# One gateway per process so every pipeline and script shares the pool and routing state
+_gateway: Optional[AzureOpenAIGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> AzureOpenAIGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = gateway_from_env()
+    return _gateway
@@ -0,0 +1,293 @@
+"""
+Tiered PII detection used by the anonymization helpers.
+
+Tier 1 runs every recognizer in the Presidio analyzer's registry that does not need spaCy (URL,
+email, phone, card, SSN, ITIN, passport, driver licence, bank number, IBAN, crypto, NHS, medical
+licence, IP, MAC, dates, plus any custom pattern recognizers added to the analyzer) directly over
+the whole text, together with the precompiled PATTERN_RECOGNIZERS below. None of these run the
+NLP pipeline, so they cost microseconds to milliseconds. Tier 2 runs Presidio's spaCy NER only on
+the segments a cheap heuristic flags as possibly containing a person / location name
+(capitalised words that are not ordinary sentence starters or known acronyms). A question such
+as "status of IN0042923?" therefore never runs spaCy over the text, while keeping the entity
+coverage of the full analyzer.
+
+Configuration (backend/.env):
+  PII_ENGINE             tiered (default) | presidio  — presidio = run the full analyzer on everything
+  PII_PATTERN_ENTITIES   comma list of tier-1 entities (default: all registry + PATTERN_RECOGNIZERS)
+  PII_NER_ENTITIES       entities requested from the NER tier (default PERSON,LOCATION,NRP,DATE_TIME)
+  PII_NER_MODE           auto (default, heuristic) | always | off
+
+`troubleshooting/pii_benchmark.py` compares latency and recall against the full Presidio pipeline.
+"""
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+
+class PiiSpan:
+    """A detected PII span; mirrors the fields of presidio's RecognizerResult that we use."""
+
+    __slots__ = ("entity_type", "start", "end", "score")
+
+    def __init__(self, entity_type: str, start: int, end: int, score: float):
+        self.entity_type = entity_type
+        self.start = start
+        self.end = end
+        self.score = score
+
+    def __repr__(self):
+        return f"PiiSpan({self.entity_type}, {self.start}, {self.end}, {self.score:.2f})"
+
+
+def _luhn_ok(candidate: str) -> bool:
+    digits = [int(c) for c in candidate if c.isdigit()]
+    if not 13 <= len(digits) <= 19:
+        return False
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        if i % 2 == 1:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total % 10 == 0
+
+
+_MONTHS = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?"
+
+# entity -> (compiled pattern, score, optional validator)
+PATTERN_RECOGNIZERS: Dict[str, tuple] = {
+    "EMAIL_ADDRESS": (
+        re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"),
+        1.0,
+        None,
+    ),
+    "CREDIT_CARD": (
+        re.compile(r"(?<![\d-])(?:\d[ -]?){12,18}\d(?![\d-])"),
+        0.9,
+        _luhn_ok,
+    ),
+    "US_SSN": (
+        re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
+        0.85,
+        None,
+    ),
+    "IBAN_CODE": (
+        re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b"),
+        0.85,
+        None,
+    ),
+    "IP_ADDRESS": (
+        re.compile(r"\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b"),
+        0.85,
+        None,
+    ),
+    "PHONE_NUMBER": (
+        re.compile(
+            r"(?<![\w+-])(?:\+\d{1,3}[\s.-]?)?(?:\(?\d{1,4}\)?[\s.-])?\d{3,4}[\s.-]\d{3,4}(?:[\s.-]\d{2,4})?(?![\w-])"
+            r"|(?<![\w+])\+\d{9,15}\b"
+        ),
+        0.75,
+        None,
+    ),
+    "DATE_TIME": (
+        re.compile(
+            r"\b\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\b"
+            r"|\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}(?: \d{1,2}:\d{2}(?::\d{2})?)?\b"
+            rf"|\b\d{{1,2}} {_MONTHS} \d{{4}}\b"
+            rf"|\b{_MONTHS} \d{{1,2}},? \d{{4}}\b"
+        ),
+        0.6,
+        None,
+    ),
+}
+
+DEFAULT_NER_ENTITIES = ["PERSON", "LOCATION", "NRP", "DATE_TIME"]
+
+# Capitalised words that routinely start a sentence or appear in tickets without being names
+_COMMON_CAPITALISED = {
+    "a", "an", "and", "are", "as", "at", "but", "by", "can", "could", "did", "do", "does", "for",
+    "from", "give", "has", "have", "hello", "hi", "how", "i", "if", "in", "is", "it", "list",
+    "may", "no", "not", "of", "ok", "on", "or", "please", "provide", "show", "so", "summarize",
+    "tell", "thanks", "that", "the", "there", "these", "this", "to", "was", "we", "what",
+    "when", "where", "which", "who", "why", "will", "with", "would", "yes", "you",
+    # ticket / SLA vocabulary
+    "assigned", "assignee", "category", "closed", "created", "critical", "description", "high",
+    "incident", "last", "low", "medium", "new", "open", "pending", "priority", "resolved",
+    "sla", "status", "ticket", "update", "updated",
+}
+_ACRONYMS = {"SLA", "KB", "PII", "ID", "IT", "API", "VPN", "URL", "CSV", "PDF", "FAQ", "ETA", "UTC", "GMT"}
+
+_WORD = re.compile(r"[^\W\d_][\w'-]*")
+_SEGMENT_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+_MAX_SEGMENT = 1000
+
+
+def might_contain_names(segment: str) -> bool:
+    """Cheap check for capitalised words that could be a person or place name."""
+    for m in _WORD.finditer(segment):
+        word = m.group(0).split("'")[0]
+        if not word or any(c.isdigit() for c in word):
+            continue  # ticket ids, hostnames, versions
+        if word[0].isupper() and not word.isupper():
+            if word.lower() not in _COMMON_CAPITALISED:
+                return True
+        elif word.isupper() and len(word) >= 3 and word not in _ACRONYMS:
+            # Some exports upper-case whole names ("JOHN SMITH")
+            return True
+    return False
+
+
+def _segments(text: str):
+    """Yield (start, segment) pairs: sentences/lines, long ones split into bounded windows."""
+    pos = 0
+    for m in list(_SEGMENT_BREAK.finditer(text)) + [None]:
+        end = m.start() if m else len(text)
+        while end - pos > _MAX_SEGMENT:
+            # split on the last space inside the window so words are not cut in half
+            cut = text.rfind(" ", pos, pos + _MAX_SEGMENT)
+            cut = cut if cut > pos else pos + _MAX_SEGMENT
+            yield pos, text[pos:cut]
+            pos = cut
+        if end > pos:
+            yield pos, text[pos:end]
+        pos = m.end() if m else len(text)
+
+
+def _resolve_overlaps(spans: List[PiiSpan]) -> List[PiiSpan]:
+    """Keep non-overlapping spans, preferring the longer (then higher-scoring) one."""
+    chosen: List[PiiSpan] = []
+    for span in sorted(spans, key=lambda s: (-(s.end - s.start), -s.score, s.start)):
+        if all(span.end <= c.start or span.start >= c.end for c in chosen):
+            chosen.append(span)
+    return sorted(chosen, key=lambda s: s.start)
+
+
+def registry_pattern_recognizers(analyzer, language: str) -> list:
+    """The analyzer's recognizers that work without NLP artifacts (everything but spaCy NER)."""
+    from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+    return [
+        r for r in analyzer.registry.get_recognizers(language=language, all_fields=True)
+        if not isinstance(r, SpacyRecognizer)
+    ]
+
+
+class TieredPiiEngine:
+    """Pattern pre-pass over the whole text plus NER on candidate segments only."""
+
+    def __init__(
+        self,
+        get_analyzer: Callable,
+        pattern_entities: Optional[List[str]] = None,
+        ner_entities: Optional[List[str]] = None,
+        ner_mode: str = "auto",
+    ):
+        self.get_analyzer = get_analyzer
+        self.pattern_entities = set(pattern_entities) if pattern_entities is not None else None
+        self.patterns = {
+            n: rec for n, rec in PATTERN_RECOGNIZERS.items()
+            if self.pattern_entities is None or n in self.pattern_entities
+        }
+        self.ner_entities = ner_entities if ner_entities is not None else list(DEFAULT_NER_ENTITIES)
+        if ner_mode not in ("auto", "always", "off"):
+            raise ValueError(f"PII_NER_MODE must be auto, always or off (got {ner_mode!r})")
+        self.ner_mode = ner_mode
+        # language -> [(recognizer, entities)], resolved from the analyzer on first use
+        self._registry: Dict[str, list] = {}
+        self._registry_lock = threading.Lock()
+        # counters for the benchmark / diagnostics
+        self.segments_seen = 0
+        self.segments_ner = 0
+
+    def _registry_tier(self, language: str) -> list:
+        with self._registry_lock:
+            tier = self._registry.get(language)
+            if tier is None:
+                tier = []
+                known = set(PATTERN_RECOGNIZERS)
+                for recognizer in registry_pattern_recognizers(self.get_analyzer(), language):
+                    known.update(recognizer.supported_entities)
+                    entities = [
+                        e for e in recognizer.supported_entities
+                        if self.pattern_entities is None or e in self.pattern_entities
+                    ]
+                    if entities:
+                        tier.append((recognizer, entities))
+                unknown = sorted((self.pattern_entities or set()) - known)
+                if unknown:
+                    print(f"[warn] PII_PATTERN_ENTITIES: no pattern recognizer for {', '.join(unknown)}")
+                self._registry[language] = tier
+            return tier
+
+    def pattern_spans(self, text: str, language: str = "en") -> List[PiiSpan]:
+        spans = []
+        for entity, (pattern, score, validator) in self.patterns.items():
+            for m in pattern.finditer(text):
+                if validator is None or validator(m.group(0)):
+                    spans.append(PiiSpan(entity, m.start(), m.end(), score))
+        for recognizer, entities in self._registry_tier(language):
+            try:
+                results = recognizer.analyze(text=text, entities=entities, nlp_artifacts=None)
+            except Exception as e:
+                print(f"[warn] PII recognizer {recognizer.name} failed: {type(e).__name__}: {e}")
+                continue
+            spans.extend(PiiSpan(r.entity_type, r.start, r.end, r.score) for r in results or [])
+        return spans
+
+    def ner_spans(self, text: str, language: str) -> List[PiiSpan]:
+        if self.ner_mode == "off" or not self.ner_entities:
+            return []
+        spans = []
+        for offset, segment in _segments(text):
+            self.segments_seen += 1
+            if self.ner_mode == "auto" and not might_contain_names(segment):
+                continue
+            self.segments_ner += 1
+            for r in self.get_analyzer().analyze(text=segment, language=language, entities=self.ner_entities):
+                spans.append(PiiSpan(r.entity_type, offset + r.start, offset + r.end, r.score))
+        return spans
+
+    def analyze(self, text: str, language: str = "en") -> List[PiiSpan]:
+        if not text:
+            return []
+        return _resolve_overlaps(self.pattern_spans(text, language) + self.ner_spans(text, language))
+
+
+class PresidioPiiEngine:
+    """The original behaviour: the full Presidio recognizer set over the whole text."""
+
+    def __init__(self, get_analyzer: Callable):
+        self.get_analyzer = get_analyzer
+
+    def analyze(self, text: str, language: str = "en") -> List[PiiSpan]:
+        if not text:
+            return []
+        results = self.get_analyzer().analyze(text=text, language=language)
+        return _resolve_overlaps([PiiSpan(r.entity_type, r.start, r.end, r.score) for r in results])
+
+
+def _env_list(name: str) -> Optional[List[str]]:
+    raw = os.getenv(name)
+    if raw is None:
+        return None
+    return [item.strip() for item in raw.split(",") if item.strip()]
+
+
+def engine_from_env(get_analyzer: Callable):
+    if os.getenv("PII_ENGINE", "tiered").lower() == "presidio":
+        return PresidioPiiEngine(get_analyzer)
+    return TieredPiiEngine(
+        get_analyzer,
+        pattern_entities=_env_list("PII_PATTERN_ENTITIES"),
+        ner_entities=_env_list("PII_NER_ENTITIES"),
+        ner_mode=os.getenv("PII_NER_MODE", "auto").lower(),
+    )
+
+
+@lru_cache(maxsize=32)
+def compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Compiled preserve_regex patterns, cached so callers don't recompile per call."""
+    return re.compile(pattern)
@@ -0,0 +1,494 @@
+"""
+Time-partitioned SLA index: one Chroma shard per ticket month (older history per quarter).
+
+Layout inside an SLA index version (see index_manager.py):
+
+    .indexes/sla/v20261019-101500/
+      shards/2026-09/  shards/2026-10/  shards/2025-Q4/  shards/undated/  ...
+      shards/manifest.json     # embeddings identity; period, fingerprint and ticket ids per shard
+    .indexes/sla_archive/
+      2024-Q1/  2024-Q2/  ...  manifest.json   # archived periods, shared by all versions
+
+Building: rows are grouped by their opened date (SLA_DATE_COLUMN), each shard is chunked and
+embedded independently (in parallel), and a shard whose fingerprint matches the previous version
+is copied instead of re-embedded, so a nightly rebuild only embeds the months that changed. The
+fingerprint covers the chunk text and the embeddings identity (model, deployment and vector
+dimension, recorded in the manifest), so switching embedding models re-embeds every shard.
+Months older than SLA_MONTHLY_SHARDS are compacted into quarter shards. Periods older than
+SLA_ARCHIVE_AFTER_MONTHS are moved out of the versions: each is built (or copied from the previous
+version) once into the archive dir, later builds skip it while its rows are unchanged, and it is
+never searched. The version manifest lists archived periods with their archive path.
+
+Querying: ticket ids in the question select the shard holding that ticket; explicit dates and
+phrases like "last week", "this month", "Q2 2025" or "recent" select the overlapping shards;
+anything else searches the hot shards (last SLA_HOT_MONTHS months + undated). Cold shards are only
+searched as a fallback when the selected shards return fewer than k chunks.
+
+Env:
+  SLA_SHARDING               true (default) | false — false builds one flat store as before
+  SLA_DATE_COLUMN            column used to partition rows (default: Opened, then Created)
+  SLA_MONTHLY_SHARDS         months kept as monthly shards before compacting to quarters (default 6)
+  SLA_HOT_MONTHS             months searched when the question has no time window (default 3)
+  SLA_ARCHIVE_AFTER_MONTHS   archive (never search) periods older than this; 0 = never (default)
+  SLA_ARCHIVE_DIR            where archived periods are kept (default: .indexes/sla_archive)
+  SLA_SHARD_BUILD_WORKERS    shards built in parallel (default 4)
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ticket_fast_path import TICKET_ID, record_ticket_id
+
+SHARDS_DIR = "shards"
+MANIFEST_FILE = "manifest.json"
+UNDATED = "undated"
+
+_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def sharding_enabled() -> bool:
+    return os.getenv("SLA_SHARDING", "true").lower() not in ("false", "0")
+
+
+# ===== Periods =====
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_months(d: date, months: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def _month_end(d: date) -> date:
+    return _add_months(d, 1) - timedelta(days=1)
+
+
+def _quarter_start(d: date) -> date:
+    return date(d.year, 3 * ((d.month - 1) // 3) + 1, 1)
+
+
+def period_for(d: Optional[date], today: date, monthly_months: int) -> Tuple[str, Optional[date], Optional[date]]:
+    """Shard key and [start, end] for a row date: monthly when recent, quarterly when older."""
+    if d is None:
+        return UNDATED, None, None
+    if _month_start(d) >= _add_months(_month_start(today), -monthly_months + 1):
+        start = _month_start(d)
+        return start.strftime("%Y-%m"), start, _month_end(d)
+    start = _quarter_start(d)
+    return f"{d.year}-Q{(d.month - 1) // 3 + 1}", start, _add_months(start, 3) - timedelta(days=1)
+
+
+def parse_row_date(value) -> Optional[date]:
+    text = str(value).strip()
+    if not text or text.lower() in ("nan", "nat", "none"):
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text[:19], fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        return None
+
+
+def _date_column(record: Dict[str, str]) -> Optional[str]:
+    preferred = os.getenv("SLA_DATE_COLUMN")
+    candidates = [preferred] if preferred else ["Opened", "Created", "Opened at", "Created on"]
+    for c in candidates:
+        if c in record:
+            return c
+    return None
+
+
+# ===== Time windows in questions =====
+def parse_time_window(text: str, today: date) -> Optional[Tuple[date, date]]:
+    """The date range a question refers to, or None. Several mentions are merged into one range."""
+    t = text.lower()
+    windows: List[Tuple[date, date]] = []
+    monday = today - timedelta(days=today.weekday())
+
+    if re.search(r"\btoday\b", t):
+        windows.append((today, today))
+    if re.search(r"\byesterday\b", t):
+        windows.append((today - timedelta(days=1), today - timedelta(days=1)))
+    if re.search(r"\bthis week\b", t):
+        windows.append((monday, today))
+    if re.search(r"\blast week\b", t):
+        windows.append((monday - timedelta(days=7), monday - timedelta(days=1)))
+    if re.search(r"\bthis month\b", t):
+        windows.append((_month_start(today), today))
+    if re.search(r"\blast month\b", t):
+        start = _add_months(_month_start(today), -1)
+        windows.append((start, _month_end(start)))
+    if re.search(r"\bthis quarter\b", t):
+        windows.append((_quarter_start(today), today))
+    if re.search(r"\blast quarter\b", t):
+        start = _add_months(_quarter_start(today), -3)
+        windows.append((start, _add_months(start, 3) - timedelta(days=1)))
+    if re.search(r"\bthis year\b", t):
+        windows.append((date(today.year, 1, 1), today))
+    if re.search(r"\blast year\b", t):
+        windows.append((date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)))
+    for n, unit in re.findall(r"\b(?:last|past|previous)\s+(\d{1,3})\s+(day|week|month)s?\b", t):
+        days = int(n) * {"day": 1, "week": 7, "month": 31}[unit]
+        windows.append((today - timedelta(days=days), today))
+    if re.search(r"\b(recent|recently|latest|newest)\b", t):
+        windows.append((today - timedelta(days=30), today))
+
+    # explicit dates
+    for y, m, d in re.findall(r"\b(20\d{2})-(\d{2})-(\d{2})\b", t):
+        try:
+            day = date(int(y), int(m), int(d))
+            windows.append((day, day))
+        except ValueError:
+            pass
+    for y, m in re.findall(r"\b(20\d{2})-(\d{2})\b(?!-\d)", t):
+        if 1 <= int(m) <= 12:
+            start = date(int(y), int(m), 1)
+            windows.append((start, _month_end(start)))
+    for mon, y in re.findall(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(20\d{2})\b", t):
+        start = date(int(y), _MONTHS[mon], 1)
+        windows.append((start, _month_end(start)))
+    for d, mon, y in re.findall(r"\b(\d{1,2})\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(20\d{2})\b", t):
+        try:
+            day = date(int(y), _MONTHS[mon], int(d))
+            windows.append((day, day))
+        except ValueError:
+            pass
+    for q, y in re.findall(r"\bq([1-4])\s*(20\d{2})\b", t):
+        start = date(int(y), 3 * (int(q) - 1) + 1, 1)
+        windows.append((start, _add_months(start, 3) - timedelta(days=1)))
+    if not windows:
+        for y in re.findall(r"\b(?:in|during|since|for)\s+(20\d{2})\b", t):
+            windows.append((date(int(y), 1, 1), date(int(y), 12, 31)))
+
+    if not windows:
+        return None
+    return min(w[0] for w in windows), max(w[1] for w in windows)
+
+
+# ===== Building =====
+def partition_records(records: List[Dict[str, str]], today: date) -> Dict[str, dict]:
+    """Group Excel records into shards: {key: {"start", "end", "rows", "tickets"}}."""
+    monthly = _env_int("SLA_MONTHLY_SHARDS", 6)
+    shards: Dict[str, dict] = {}
+    for record in records:
+        column = _date_column(record)
+        row_date = parse_row_date(record[column]) if column else None
+        key, start, end = period_for(row_date, today, monthly)
+        shard = shards.setdefault(key, {"start": start, "end": end, "rows": [], "tickets": []})
+        shard["rows"].append(" ".join(str(v) for v in record.values()))
+        ticket_id = record_ticket_id(record)
+        if ticket_id:
+            shard["tickets"].append(ticket_id)
+    return shards
+
+
+def _chunk(rows: List[str], chunk_size: int, chunk_overlap: int) -> List[str]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_text("\n".join(rows))
+
+
+def embeddings_identity(embeddings) -> dict:
+    """What produced a shard's vectors: model / deployment names and the dimension of one probe vector."""
+    identity = getattr(embeddings, "identity", None)
+    names = identity() if callable(identity) else {
+        "model": str(getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+                     or type(embeddings).__name__),
+        "deployment": str(getattr(embeddings, "deployment", None) or ""),
+    }
+    return {**names, "dim": len(embeddings.embed_query("embedding dimension probe"))}
+
+
+def _fingerprint(chunks: List[str], identity: dict) -> str:
+    # Vectors from another model (or dimension) must never be reused, so the identity is hashed too
+    h = hashlib.sha1(json.dumps(identity, sort_keys=True).encode("utf-8"))
+    for c in chunks:
+        h.update(c.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _open_chroma(persist_dir: str, embeddings):
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(embedding_function=embeddings, persist_directory=persist_dir)
+
+
+def _load_manifest(version_dir: str) -> Optional[dict]:
+    path = os.path.join(version_dir, SHARDS_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _archive_root(version_dir: str) -> str:
+    # Next to the index root rather than inside it, so version cleanup never touches it
+    index_root = os.path.dirname(os.path.abspath(version_dir))
+    return os.getenv("SLA_ARCHIVE_DIR") or os.path.join(os.path.dirname(index_root), "sla_archive")
+
+
+def _load_archive(archive_dir: str) -> dict:
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _archive_shard(key, shard, archive_dir, archived, previous, previous_dir, embeddings, identity,
+                   batch_size, chunk_size, chunk_overlap) -> dict:
+    """Build an archived period once into `archive_dir`; unchanged periods are skipped."""
+    # Fingerprint the rows so an already archived period is not even chunked again
+    rows_fingerprint = _fingerprint(shard["rows"] + [f"{chunk_size}/{chunk_overlap}"], identity)
+    target = os.path.join(archive_dir, key)
+    entry = archived.get(key)
+    if entry and entry.get("fingerprint") == rows_fingerprint and os.path.isdir(target):
+        return entry
+    chunks = _chunk(shard["rows"], chunk_size, chunk_overlap)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    old = previous.get(key)
+    source = os.path.join(previous_dir, SHARDS_DIR, key) if previous_dir else None
+    if old and old.get("fingerprint") == _fingerprint(chunks, identity) and source and os.path.isdir(source):
+        shutil.copytree(source, tmp)
+    else:
+        store = _open_chroma(tmp, embeddings)
+        for i in range(0, len(chunks), batch_size):
+            store.add_texts(chunks[i : i + batch_size])
+        del store
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    print(f"SLA shard {key} archived to {target}")
+    return {
+        "start": shard["start"].isoformat(),
+        "end": shard["end"].isoformat(),
+        "chunks": len(chunks),
+        "fingerprint": rows_fingerprint,
+        "embeddings": identity,
+    }
+
+
+def build_sharded_store(
+    version_dir: str,
+    embeddings,
+    records: List[Dict[str, str]],
+    previous_dir: Optional[str] = None,
+    batch_size: int = 50,
+    today: Optional[date] = None,
+    chunk_size: int = 512,
+    chunk_overlap: int = 200,
+    archive_dir: Optional[str] = None,
+) -> int:
+    """Build every live shard of a new version; returns the total number of chunks served."""
+    today = today or date.today()
+    archive_after = _env_int("SLA_ARCHIVE_AFTER_MONTHS", 0)
+    archive_before = _add_months(_month_start(today), -archive_after) if archive_after else None
+    previous_manifest = (_load_manifest(previous_dir) or {}) if previous_dir else {}
+    previous = previous_manifest.get("shards", {})
+    identity = embeddings_identity(embeddings)
+    if previous and previous_manifest.get("embeddings") != identity:
+        print(f"[info] SLA embeddings changed ({previous_manifest.get('embeddings')} -> {identity}); "
+              f"no shard of {previous_dir} is reused.")
+    shards_root = os.path.join(version_dir, SHARDS_DIR)
+    os.makedirs(shards_root, exist_ok=True)
+
+    def build_one(key: str, shard: dict) -> Tuple[str, dict]:
+        chunks = _chunk(shard["rows"], chunk_size, chunk_overlap)
+        fingerprint = _fingerprint(chunks, identity)
+        target = os.path.join(shards_root, key)
+        old = previous.get(key)
+        source = os.path.join(previous_dir, SHARDS_DIR, key) if previous_dir else None
+        if old and old.get("fingerprint") == fingerprint and source and os.path.isdir(source):
+            shutil.copytree(source, target)
+            reused = True
+        else:
+            store = _open_chroma(target, embeddings)
+            for i in range(0, len(chunks), batch_size):
+                store.add_texts(chunks[i : i + batch_size])
+            reused = False
+        return key, {
+            "start": shard["start"].isoformat() if shard["start"] else None,
+            "end": shard["end"].isoformat() if shard["end"] else None,
+            "chunks": len(chunks),
+            "fingerprint": fingerprint,
+            "reused": reused,
+        }
+
+    shards = partition_records(records, today)
+    old_keys = [k for k, v in shards.items() if archive_before and v["end"] and v["end"] < archive_before]
+    manifest = {"built": today.isoformat(), "embeddings": identity, "shards": {}, "tickets": {}, "archive": {}}
+    if old_keys:
+        archive_dir = archive_dir or _archive_root(version_dir)
+        os.makedirs(archive_dir, exist_ok=True)
+        archived = _load_archive(archive_dir)
+        for key in old_keys:
+            archived[key] = _archive_shard(key, shards.pop(key), archive_dir, archived, previous, previous_dir,
+                                           embeddings, identity, batch_size, chunk_size, chunk_overlap)
+            manifest["archive"][key] = {**archived[key], "path": os.path.join(archive_dir, key)}
+        with open(os.path.join(archive_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(archived, f, indent=1)
+
+    workers = max(_env_int("SLA_SHARD_BUILD_WORKERS", 4), 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, info in executor.map(lambda kv: build_one(*kv), shards.items()):
+            manifest["shards"][key] = info
+    for key, shard in shards.items():
+        for ticket in shard["tickets"]:
+            manifest["tickets"][ticket] = key
+
+    with open(os.path.join(shards_root, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    reused = [k for k, v in manifest["shards"].items() if v["reused"]]
+    print(f"SLA shards built: {len(shards)} ({len(reused)} reused unchanged), "
+          f"{sum(v['chunks'] for v in manifest['shards'].values())} chunks; "
+          f"{len(manifest['archive'])} archived periods left out.")
+    return sum(v["chunks"] for v in manifest["shards"].values())
+
+
+# ===== Serving =====
+class ShardedStore:
+    """Vectorstore facade over the shards of one version, with date-aware shard pruning."""
+
+    supports_time_hint = True
+
+    def __init__(self, version_dir: str, embeddings, manifest: dict):
+        self.version_dir = version_dir
+        self.embeddings = embeddings
+        self.manifest = manifest
+        self.hot_months = _env_int("SLA_HOT_MONTHS", 3)
+        self._stores: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self, key: str):
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                store = _open_chroma(os.path.join(self.version_dir, SHARDS_DIR, key), self.embeddings)
+                self._stores[key] = store
+            return store
+
+    def _searchable(self) -> Dict[str, dict]:
+        return {k: v for k, v in self.manifest["shards"].items() if v["chunks"]}
+
+    def select_shards(self, hint: str, today: Optional[date] = None) -> Tuple[List[str], List[str]]:
+        """(primary, fallback) shard keys for a question."""
+        today = today or date.today()
+        shards = self._searchable()
+        primary = set()
+
+        tickets = {m.upper() for m in TICKET_ID.findall(hint or "")}
+        for ticket in tickets:
+            key = self.manifest["tickets"].get(ticket)
+            if key in shards:
+                primary.add(key)
+
+        window = parse_time_window(hint or "", today)
+        if window:
+            start, end = window
+            for key, info in shards.items():
+                if info["start"] and date.fromisoformat(info["start"]) <= end and date.fromisoformat(info["end"]) >= start:
+                    primary.add(key)
+
+        if not tickets and not window:
+            hot_from = _add_months(_month_start(today), -self.hot_months + 1)
+            for key, info in shards.items():
+                if info["end"] is None or date.fromisoformat(info["end"]) >= hot_from:
+                    primary.add(key)
+
+        # newest first so the fallback reaches recent history before old quarters
+        order = sorted(shards, key=lambda k: shards[k]["start"] or "", reverse=True)
+        return [k for k in order if k in primary], [k for k in order if k not in primary]
+
+    def _search_keys(self, keys: List[str], vector, k: int):
+        scored = []
+        for key in keys:
+            n = min(k, self.manifest["shards"][key]["chunks"])
+            scored.extend(self._shard(key).similarity_search_by_vector_with_relevance_scores(vector, k=n))
+        # Chroma returns distances: lower is closer
+        scored.sort(key=lambda pair: pair[1])
+        return [doc for doc, _ in scored[:k]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, time_hint: str = ""):
+        primary, fallback = self.select_shards(time_hint)
+        docs = self._search_keys(primary, embedding, k)
+        if len(docs) < k and fallback:
+            docs += self._search_keys(fallback, embedding, k - len(docs))
+        return docs
+
+    def similarity_search(self, query: str, k: int = 4, time_hint: str | None = None):
+        vector = self.embeddings.embed_query(query)
+        return self.similarity_search_by_vector(vector, k=k, time_hint=time_hint if time_hint is not None else query)
+
+    def persist(self):
+        pass  # every shard is persisted when it is built
+
+
+def open_sharded_store(persist_dir: str, embeddings):
+    """ShardedStore for a sharded version dir, or None so the caller opens a flat Chroma store."""
+    manifest = _load_manifest(persist_dir)
+    return ShardedStore(persist_dir, embeddings, manifest) if manifest else None
+
+
+# ===== CLI =====
+def main(argv=None):
+    """Inspect the shards of the served SLA version and which ones a question would search."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect time-partitioned SLA index shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("explain")
+    p.add_argument("question")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from multiple_data_processing import get_sla_index
+
+    index = get_sla_index()
+    index.ensure_ready()
+    store = index.store
+    if not isinstance(store, ShardedStore):
+        print(f"SLA version {index.version} is not sharded (rebuild with SLA_SHARDING=true).")
+        return 1
+    if args.command == "list":
+        identity = store.manifest.get("embeddings") or {}
+        print(f"sla {index.version} (embeddings: {identity.get('model', '?')} / "
+              f"{identity.get('deployment') or '-'}, {identity.get('dim', '?')} dims):")
+        for key, info in sorted(store.manifest["shards"].items(), key=lambda kv: kv[1]["start"] or ""):
+            print(f"  {key:<8} {info['start'] or '-':>10} .. {info['end'] or '-':<10} {info['chunks']:>6} chunks")
+        for key, info in sorted(store.manifest.get("archive", {}).items(), key=lambda kv: kv[1]["start"]):
+            print(f"  {key:<8} {info['start']:>10} .. {info['end']:<10} {info['chunks']:>6} chunks "
+                  f"archived ({info['path']}, not searched)")
+    else:
+        primary, fallback = store.select_shards(args.question)
+        print(f"time window: {parse_time_window(args.question, date.today())}")
+        print(f"searched:    {', '.join(primary) or '(none)'}")
+        print(f"fallback:    {', '.join(fallback) or '(none)'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
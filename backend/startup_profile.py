@@ -0,0 +1,254 @@
+"""
+Startup profiler: how long (and how much memory) each import / init phase costs.
+
+Usage:
+  # from the backend folder
+  python startup_profile.py                      # import + gateway + Presidio phases
+  python startup_profile.py --pipelines          # also open/build the KB and SLA pipelines
+  python startup_profile.py --imports 15         # top 15 modules by cumulative import time
+  python startup_profile.py --save-baseline      # record the current numbers as the baseline
+  python startup_profile.py --check              # fail (exit 1) if a phase regressed vs baseline
+
+The phases run in order in a fresh interpreter, so their numbers are the *incremental* cost on top
+of the phases before it (the same order a bot process pays them in). Times are the median of `--repeat`
+passes without tracemalloc (tracing slows imports several times over); allocated / peak memory
+come from one more fresh pass with tracemalloc on. The report also lists which heavy libraries are loaded after each
+phase; serving from a built index should never load llama_index or pandas.
+
+backend/startup_baseline.json is committed; `--check` exits 2 when it is missing. The Docker image
+has an opt-in gate: `docker build -f infra/Dockerfile --target startup-check .`
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "startup_baseline.json")
+_RESULT_PREFIX = "STARTUP_PROFILE_RESULT "
+
+# Libraries worth watching: ingestion-only ones should stay unloaded on the serving path, and
+# the SDK stack (langchain_core, openai, httpx) explains what the gateway phase pays for
+HEAVY_MODULES = ["langchain_core", "langchain_openai", "langchain_community", "openai", "httpx", "chromadb",
+                 "presidio_analyzer", "spacy", "llama_index", "pandas"]
+
+
+def _rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _phases(include_pipelines: bool):
+    def import_module():
+        import multiple_data_processing  # noqa: F401
+
+    def gateway():
+        from multiple_data_processing import initialize_embeddings, initialize_llm
+
+        initialize_embeddings()
+        initialize_llm()
+
+    def analyzer():
+        from multiple_data_processing import get_analyzer
+
+        get_analyzer()
+
+    def anonymizer():
+        from multiple_data_processing import get_anonymizer
+
+        get_anonymizer()
+
+    phases = [
+        ("import multiple_data_processing", import_module),
+        ("init gateway (embeddings + llm)", gateway),
+        ("init presidio analyzer", analyzer),
+        ("init presidio anonymizer", anonymizer),
+    ]
+    if include_pipelines:
+        def kb():
+            from multiple_data_processing import initialize_kb_rag_pipeline
+
+            initialize_kb_rag_pipeline()
+
+        def sla():
+            from multiple_data_processing import initialize_sla_rag_pipeline
+
+            initialize_sla_rag_pipeline()
+
+        phases += [("init KB pipeline", kb), ("init SLA pipeline", sla)]
+    return phases
+
+
+def _run_phases(include_pipelines: bool, trace_memory: bool) -> list[dict]:
+    """Run every phase in this (fresh) process; memory is traced only when `trace_memory`."""
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+
+    results = []
+    if trace_memory:
+        tracemalloc.start()
+    for name, fn in _phases(include_pipelines):
+        if trace_memory:
+            tracemalloc.reset_peak()
+            mem_before, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        error = None
+        try:
+            fn()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        result = {"phase": name, "seconds": round(elapsed, 4), "error": error}
+        if trace_memory:
+            mem_after, mem_peak = tracemalloc.get_traced_memory()
+            result["alloc_mb"] = round((mem_after - mem_before) / (1024 * 1024), 2)
+            result["peak_mb"] = round((mem_peak - mem_before) / (1024 * 1024), 2)
+        else:
+            result["max_rss_mb"] = None if _rss_mb() is None else round(_rss_mb(), 1)
+            result["heavy_loaded"] = [m for m in HEAVY_MODULES if m in sys.modules]
+        results.append(result)
+    if trace_memory:
+        tracemalloc.stop()
+    return results
+
+
+def _run_pass(kind: str, include_pipelines: bool) -> list[dict]:
+    args = [sys.executable, os.path.abspath(__file__), "--pass", kind]
+    if include_pipelines:
+        args.append("--pipelines")
+    proc = subprocess.run(args, cwd=HERE, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(_RESULT_PREFIX):
+            return json.loads(line[len(_RESULT_PREFIX):])
+    raise RuntimeError(f"{kind} pass failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def profile_phases(include_pipelines: bool = False, repeat: int = 3) -> list[dict]:
+    """Median phase times over `repeat` fresh processes without tracemalloc, plus one traced pass for memory."""
+    runs = [_run_pass("timing", include_pipelines) for _ in range(max(repeat, 1))]
+    memory = {r["phase"]: r for r in _run_pass("memory", include_pipelines)}
+    results = []
+    for i, r in enumerate(runs[-1]):
+        traced = memory.get(r["phase"], {})
+        results.append({
+            "phase": r["phase"],
+            "seconds": round(statistics.median(run[i]["seconds"] for run in runs), 4),
+            "alloc_mb": traced.get("alloc_mb"),
+            "peak_mb": traced.get("peak_mb"),
+            "max_rss_mb": r["max_rss_mb"],
+            "heavy_loaded": r["heavy_loaded"],
+            "error": r["error"],
+        })
+    return results
+
+
+def profile_imports(module: str = "multiple_data_processing", top: int = 15) -> list[tuple[str, float]]:
+    """Per-module cumulative import time, via a fresh `python -X importtime` subprocess."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        m = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if m and len(m.group(2)) <= 3:  # the module itself and its direct imports
+            timings.append((m.group(3), int(m.group(1)) / 1e6))
+    return sorted(timings, key=lambda t: t[1], reverse=True)[:top]
+
+
+def check_regressions(results: list[dict], baseline: dict, tolerance: float, min_seconds: float) -> list[str]:
+    """Phases whose time grew by more than `tolerance` (fraction) and at least `min_seconds`."""
+    previous = {r["phase"]: r for r in baseline.get("phases", [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r["phase"])
+        if not old or r["error"] or old.get("error"):
+            continue  # a phase that failed in either run has no comparable time
+        delta = r["seconds"] - old["seconds"]
+        if delta > min_seconds and r["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append(f"{r['phase']}: {old['seconds']:.3f}s -> {r['seconds']:.3f}s")
+    return regressions
+
+
+def _print_report(results: list[dict], imports: list[tuple[str, float]]):
+    print(f"{'phase':40} {'seconds':>8} {'alloc MB':>9} {'peak MB':>8} {'RSS MB':>8}  heavy modules loaded")
+    for r in results:
+        rss = "-" if r["max_rss_mb"] is None else f"{r['max_rss_mb']:.1f}"
+        alloc = "-" if r["alloc_mb"] is None else f"{r['alloc_mb']:.2f}"
+        peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.2f}"
+        print(f"{r['phase']:40} {r['seconds']:8.3f} {alloc:>9} {peak:>8} {rss:>8}  "
+              f"{', '.join(r['heavy_loaded']) or '-'}")
+        if r["error"]:
+            print(f"    [error] {r['error']}")
+    print(f"{'total':40} {sum(r['seconds'] for r in results):8.3f}")
+    if imports:
+        print("\nSlowest direct imports (cumulative):")
+        for name, seconds in imports:
+            print(f"  {name:40} {seconds:8.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile startup import/init phases.")
+    parser.add_argument("--pipelines", action="store_true", help="also initialize the KB and SLA pipelines")
+    parser.add_argument("--imports", type=int, default=0, metavar="N", help="show the N slowest imports")
+    parser.add_argument("--repeat", type=int, default=3, help="timing passes; each phase reports the median")
+    parser.add_argument("--json", action="store_true", help="print the raw results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file for --save-baseline/--check")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results to the baseline file")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any phase regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    parser.add_argument("--pass", dest="run_pass", choices=["timing", "memory"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_pass:
+        # Child process of profile_phases: one pass, results on the last stdout line
+        results = _run_phases(args.pipelines, trace_memory=args.run_pass == "memory")
+        print(_RESULT_PREFIX + json.dumps(results))
+        return 0
+
+    # Import timings use a fresh interpreter, so collect them before this process warms up
+    imports = profile_imports(top=args.imports) if args.imports else []
+    results = profile_phases(include_pipelines=args.pipelines, repeat=args.repeat)
+
+    if args.json:
+        print(json.dumps({"phases": results, "imports": imports}, indent=2))
+    else:
+        _print_report(results, imports)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "phases": results}, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\n[error] No baseline at {args.baseline}; run with --save-baseline first.")
+            return 2
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print("\nStartup regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo startup regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+LLM-free fast path for simple single-ticket field questions on the SLA bot.
+
+Questions like "what's the status of IN0042923?" or "who is IN0042923 assigned to and when was it
+last updated?" are answered straight from the ingested Excel row with a template: no embedding,
+no Presidio pass over retrieved chunks, no chat completion. Anything that is not clearly a lookup
+of known fields for exactly one ticket (or where the row's column for a requested field is missing
+or empty) returns None and the caller falls back to the full RAG path. Columns are matched on their
+exact (normalised) header, never by substring; override the headers per field with
+SLA_FAST_PATH_COLUMNS, e.g. {"assignee": ["Assigned to"], "last_update": ["Last modified"]}.
+
+The ticket table (`tickets.json`) is written next to each SLA index version during the build
+(see `build_sla_version` in multiple_data_processing.py), so serving never reads Excel.
+"""
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+TICKET_TABLE_FILE = "tickets.json"
+
+# The one ticket-id pattern; the pipelines, batch runner and SLA shards import it from here
+TICKET_ID_REGEX = r"\bIN\d{4,7}\b"
+TICKET_ID = re.compile(TICKET_ID_REGEX, re.IGNORECASE)
+_TICKET_CELL = re.compile(r"^\s*(" + TICKET_ID_REGEX + r")\s*$", re.IGNORECASE)
+
+# field -> (question pattern, exact column headers in preference order, normalised)
+FIELDS: Dict[str, tuple] = {
+    "status": (
+        re.compile(r"\b(status|state)\b", re.IGNORECASE),
+        ["status", "state", "incident state"],
+    ),
+    "assignee": (
+        re.compile(r"\b(assign(ed|ee)?|engineer|owner|who\s+is\s+(working|handling))\b", re.IGNORECASE),
+        ["assigned to", "assignee", "assigned engineer", "owner"],
+    ),
+    "last_update": (
+        re.compile(r"\b(last|latest|recent)\s+(updated|update|modified|changed|change)\b|\bupdated\b", re.IGNORECASE),
+        ["last update", "last updated", "updated", "last modified", "modified"],
+    ),
+    "priority": (
+        re.compile(r"\bpriority\b", re.IGNORECASE),
+        ["priority"],
+    ),
+    "severity": (
+        re.compile(r"\bseverity\b", re.IGNORECASE),
+        ["severity"],
+    ),
+    "opened": (
+        re.compile(r"\b(opened|created|open\s+date|raised)\b", re.IGNORECASE),
+        ["opened", "created", "open date", "opened at", "created on"],
+    ),
+}
+# "who ..." questions ask for the person, not the value: "who last updated X" -> Updated by
+WHO_FIELDS: Dict[str, str] = {
+    "assignee": "assignee",
+    "last_update": "last_updated_by",
+    "opened": "opened_by",
+}
+PERSON_COLUMNS: Dict[str, List[str]] = {
+    "last_updated_by": ["updated by", "last updated by", "modified by"],
+    "opened_by": ["opened by", "created by", "raised by"],
+}
+_WHO = re.compile(r"\bwho(m|'s)?\b", re.IGNORECASE)
+_WHEN = re.compile(r"\bwhen\b", re.IGNORECASE)
+
+# Anything open-ended goes to the LLM
+_OPEN_ENDED = re.compile(
+    r"\b(why|how|explain|summari[sz]e|describe|details?|compare|history|more\s+information|"
+    r"root\s+cause|resolution|recommend|should|could|analy[sz]e|breach|all|other|similar)\b",
+    re.IGNORECASE,
+)
+# Words allowed in a fast-path question besides field keywords and the ticket id
+_FILLER = {
+    "a", "about", "and", "any", "are", "by", "can", "current", "currently", "does", "for", "get",
+    "give", "has", "have", "i", "in", "incident", "is", "it", "its", "know", "me", "of", "on",
+    "please", "show", "tell", "the", "this", "ticket", "to", "was", "what", "what's", "whats",
+    "when", "which", "who", "who's", "whom", "with", "you", "number", "no", "check", "latest",
+    "last", "recent", "date", "time", "level", "person", "being",
+}
+MAX_QUESTION_CHARS = 200
+
+
+def _normalise_header(header: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(header).lower()).strip()
+
+
+def ticket_id_in_cell(value) -> Optional[str]:
+    """The upper-cased ticket id when `value` (an Excel cell, an input line) is exactly one, else None."""
+    m = _TICKET_CELL.match(str(value))
+    return m.group(1).upper() if m else None
+
+
+def record_ticket_id(record: Dict[str, str]) -> Optional[str]:
+    """The ticket id of an Excel record: the first cell that is a ticket id."""
+    for value in record.values():
+        ticket_id = ticket_id_in_cell(value)
+        if ticket_id:
+            return ticket_id
+    return None
+
+
+def build_ticket_table(records: List[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    """Map ticket id -> {column: value} from Excel records; the first cell that is a ticket id wins."""
+    table: Dict[str, Dict[str, str]] = {}
+    for record in records:
+        ticket_id = record_ticket_id(record)
+        if not ticket_id:
+            continue
+        table[ticket_id] = {
+            str(k): str(v).strip()
+            for k, v in record.items()
+            if str(v).strip() and str(v).strip().lower() not in ("nan", "nat", "none")
+        }
+    return table
+
+
+def save_ticket_table(table: Dict[str, Dict[str, str]], directory: str) -> str:
+    path = os.path.join(directory, TICKET_TABLE_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+    return path
+
+
+def load_ticket_table(path: str) -> Dict[str, Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_field_question(question: str) -> Optional[tuple]:
+    """Return (ticket_id, [fields]) for a simple single-ticket field lookup, else None."""
+    if not question or len(question) > MAX_QUESTION_CHARS:
+        return None
+    ids = {m.upper() for m in TICKET_ID.findall(question)}
+    if len(ids) != 1 or _OPEN_ENDED.search(question):
+        return None
+
+    fields = []
+    remainder = TICKET_ID.sub(" ", question)
+    for name, (pattern, _) in FIELDS.items():
+        if pattern.search(remainder):
+            fields.append(name)
+            remainder = pattern.sub(" ", remainder)
+    if not fields:
+        return None
+
+    # Every leftover word must be filler; otherwise the question asks for something else
+    leftover = [w for w in re.findall(r"[a-z']+", remainder.lower()) if w not in _FILLER]
+    if leftover:
+        return None
+    if _WHO.search(question):
+        # "who" only makes sense for person fields; anything else ("who changed the status") goes to RAG
+        if any(f not in WHO_FIELDS for f in fields):
+            return None
+        # "who is it assigned to and when was it last updated" still wants the timestamp
+        if not _WHEN.search(question):
+            fields = [WHO_FIELDS[f] for f in fields]
+    return ids.pop(), fields
+
+
+@lru_cache(maxsize=1)
+def _column_overrides(raw: str) -> Dict[str, List[str]]:
+    if not raw:
+        return {}
+    try:
+        overrides = json.loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"[warn] SLA_FAST_PATH_COLUMNS is not valid JSON ({e}); using the default columns")
+        return {}
+    return {field: [_normalise_header(c) for c in columns] for field, columns in overrides.items()}
+
+
+def columns_for_field(field: str) -> List[str]:
+    """Normalised headers that may hold `field`, in preference order."""
+    overrides = _column_overrides(os.getenv("SLA_FAST_PATH_COLUMNS", ""))
+    if field in overrides:
+        return overrides[field]
+    return FIELDS[field][1] if field in FIELDS else PERSON_COLUMNS[field]
+
+
+def _column_for(row: Dict[str, str], field: str) -> Optional[str]:
+    headers = {_normalise_header(h): h for h in row}
+    for name in columns_for_field(field):
+        if name in headers:
+            return headers[name]
+    return None
+
+
+def answer_from_row(ticket_id: str, fields: List[str], row: Dict[str, str], redact=None) -> Optional[str]:
+    """Template answer, or None if any requested field is missing or empty in the row."""
+    lines = [f"Ticket: {ticket_id}"]
+    for field in fields:
+        # build_ticket_table drops empty cells, so an empty column is simply not found here
+        column = _column_for(row, field)
+        if column is None or not row.get(column):
+            return None
+        value = row[column]
+        if redact is not None:
+            value = redact(value)
+        lines.append(f"- {column}: {value}")
+    return "\n".join(lines)
+
+
+class TicketFastPath:
+    """Answers field lookups from the ticket table of the currently served SLA index version."""
+
+    def __init__(self, index, redact=None):
+        self.index = index
+        self.redact = redact
+        self._table: Optional[Dict[str, Dict[str, str]]] = None
+        self._table_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.fast_path_hits = 0
+        self.fallbacks = 0
+
+    def _current_table(self) -> Optional[Dict[str, Dict[str, str]]]:
+        self.index.refresh()
+        version = self.index.version
+        if version != self._table_version:
+            path = self.index.artifact_path(TICKET_TABLE_FILE)
+            table = None
+            if path and os.path.exists(path):
+                table = load_ticket_table(path)
+            elif version is not None:
+                print(f"[info] No {TICKET_TABLE_FILE} for SLA index {version}; fast path disabled "
+                      "until the next rebuild (python index_manager.py rebuild sla)")
+            self._table, self._table_version = table, version
+        return self._table
+
+    def _answer(self, question: str) -> Optional[str]:
+        parsed = parse_field_question(question)
+        if not parsed:
+            return None
+        ticket_id, fields = parsed
+        table = self._current_table()
+        row = table.get(ticket_id) if table else None
+        return answer_from_row(ticket_id, fields, row, redact=self.redact) if row else None
+
+    def can_answer(self, question: str) -> bool:
+        """Whether try_answer would succeed (without counting it in the stats)."""
+        return self._answer(question) is not None
+
+    def try_answer(self, question: str) -> Optional[str]:
+        answer = self._answer(question)
+        with self._lock:
+            if answer is None:
+                self.fallbacks += 1
+            else:
+                self.fast_path_hits += 1
+        return answer
+
+    def stats(self) -> Dict[str, float]:
+        total = self.fast_path_hits + self.fallbacks
+        return {
+            "queries": total,
+            "fast_path": self.fast_path_hits,
+            "rag": self.fallbacks,
+            "fast_path_ratio": round(self.fast_path_hits / total, 3) if total else 0.0,
+        }
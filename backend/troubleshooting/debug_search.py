@@ -1,5 +1,5 @@
 """
-Simple debug helper to query the persisted Chroma vectorstores for a term.
+Simple debug helper to query the served KB / SLA vectorstores for a term.
 
 Usage:
   # from project root
@@ -10,49 +10,30 @@ of each matched document to help you decide if the vectorstore needs rebuilding.
 """
 import os
 import sys
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
+from multiple_data_processing import get_kb_index, get_sla_index, similarity_search
 
 load_dotenv()
 
-HERE = os.path.dirname(__file__)
 os.environ.setdefault("AZURE_OPENAI_API_KEY", os.getenv("AZURE_OPENAI_API_KEY", ""))
 
-def load_embeddings():
-    return AzureOpenAIEmbeddings(
-        azure_deployment=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME"),
-        model=os.getenv("AZURE_OPENAI_EMBEDDINGS_MODEL_NAME", "text-embedding-3-large"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPENAI_API_BASE"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION") or os.getenv("OPENAI_API_VERSION"),
-    )
-
-def search_kb(query: str, k: int = 3):
-    emb = load_embeddings()
-    persist_dir = os.path.join(HERE, ".chroma_kb")
-    if not os.path.exists(persist_dir):
-        print("KB vectorstore not found at", persist_dir)
+def _search(label: str, index, query: str, k: int):
+    # Inspect whatever the bot serves: the CURRENT versioned index (sharded for SLA) or the legacy store
+    if index.current_version() is None and not (index.legacy_dir and os.path.exists(index.legacy_dir)):
+        print(f"{label} vectorstore not built yet (python index_manager.py rebuild {index.name})")
         return
-    store = Chroma(embedding_function=emb, persist_directory=persist_dir)
-    results = store.similarity_search(query, k=k)
-    print(f"KB: found {len(results)} results for '{query}'")
+    index.ensure_ready()
+    results = similarity_search(index.store, query, k=k, time_hint=query)
+    print(f"{label} ({index.version}): found {len(results)} results for '{query}'")
     for i, doc in enumerate(results, 1):
         snippet = doc.page_content[:400].replace('\n', ' ')
         print(f"--- Result {i} ---\n{snippet}\n")
 
+def search_kb(query: str, k: int = 3):
+    _search("KB", get_kb_index(), query, k)
+
 def search_sla(query: str, k: int = 3):
-    emb = load_embeddings()
-    persist_dir = os.path.join(HERE, ".chroma_sla")
-    if not os.path.exists(persist_dir):
-        print("SLA vectorstore not found at", persist_dir)
-        return
-    store = Chroma(embedding_function=emb, persist_directory=persist_dir)
-    results = store.similarity_search(query, k=k)
-    print(f"SLA: found {len(results)} results for '{query}'")
-    for i, doc in enumerate(results, 1):
-        snippet = doc.page_content[:400].replace('\n', ' ')
-        print(f"--- Result {i} ---\n{snippet}\n")
+    _search("SLA", get_sla_index(), query, k)
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
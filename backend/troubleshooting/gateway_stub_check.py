@@ -0,0 +1,87 @@
+"""
+Exercise the Azure OpenAI gateway against local stub servers (no Azure access needed).
+
+Usage:
+  # from the backend folder
+  python .\troubleshooting\gateway_stub_check.py
+
+Starts four fake "deployments" on localhost: one always throttled (429), one always failing
+(503), one with a bad key (401) and one healthy that reports its remaining TPM. Sends a few chat calls through the
+gateway and prints the per-deployment routing stats, so you can confirm failover and quota
+tracking behave before pointing the gateway at real regions.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage
+from openai_gateway import AzureOpenAIGateway, Deployment
+
+
+def make_handler(status: int, remaining_tokens: int):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            if status == 200:
+                body = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "stub",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"hello from port {self.server.server_port}"},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10},
+                }).encode()
+            else:
+                body = json.dumps({"error": {"code": str(status), "message": "stub failure"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("x-ratelimit-remaining-tokens", str(remaining_tokens))
+            if status == 429:
+                self.send_header("retry-after", "30")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(status: int, remaining_tokens: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(status, remaining_tokens))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    servers = [start_stub(429, 0), start_stub(503, 50000), start_stub(401, 50000), start_stub(200, 42000)]
+    deployments = [
+        Deployment(
+            endpoint=f"http://127.0.0.1:{s.server_port}",
+            deployment="gpt-stub",
+            api_key="stub",
+            api_version="2024-06-01",
+            tpm=60000,
+        )
+        for s in servers
+    ]
+    gateway = AzureOpenAIGateway(chat_deployments=deployments, embedding_deployments=[])
+    try:
+        for i in range(4):
+            response = gateway.invoke_chat([HumanMessage(content=f"ping {i}")])
+            print(f"call {i}: {response.content}")
+        print(json.dumps(gateway.stats(), indent=2))
+    finally:
+        gateway.close()
+        for s in servers:
+            s.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Compare PII detection engines on a labelled sample: latency and recall.
+
+Usage:
+  # from the backend folder
+  python .\troubleshooting\pii_benchmark.py                       # uses troubleshooting/pii_sample.jsonl
+  python .\troubleshooting\pii_benchmark.py my_labels.jsonl --repeat 20
+
+Each line of the sample is {"text": "...", "pii": ["value that must be detected", ...]}.
+A label counts as found when a detected span covers it. For the tiered engines the report also
+shows agreement with the full Presidio pipeline (share of its spans the engine also covers) and
+how many text segments actually needed NER. Engines whose dependencies are missing (e.g. no spaCy
+model installed) are reported as skipped.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLE = os.path.join(HERE, "pii_sample.jsonl")
+
+from multiple_data_processing import get_analyzer
+from pii_engine import PresidioPiiEngine, TieredPiiEngine
+
+
+def load_sample(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _covered(spans, start, end):
+    return any(s.start <= start and s.end >= end for s in spans)
+
+
+def label_recall(sample, detections):
+    found = total = 0
+    for item, spans in zip(sample, detections):
+        for value in item["pii"]:
+            idx = item["text"].find(value)
+            if idx < 0:
+                continue
+            total += 1
+            found += _covered(spans, idx, idx + len(value))
+    return found / total if total else 1.0
+
+
+def agreement(reference, detections):
+    """Share of reference spans (full pipeline) that the engine also covers, by overlap."""
+    matched = total = 0
+    for ref_spans, spans in zip(reference, detections):
+        for r in ref_spans:
+            total += 1
+            matched += any(s.start < r.end and s.end > r.start for s in spans)
+    return matched / total if total else 1.0
+
+
+def run_engine(engine, sample, repeat):
+    timings, detections = [], []
+    for item in sample:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            spans = engine.analyze(item["text"])
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+        detections.append(spans)
+    return timings, detections
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    path = args[0] if args else DEFAULT_SAMPLE
+    repeat = 5
+    if "--repeat" in sys.argv:
+        try:
+            repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+        except Exception:
+            pass
+    sample = load_sample(path)
+    print(f"Sample: {path} ({len(sample)} texts, {sum(len(i['pii']) for i in sample)} labels), best of {repeat}\n")
+
+    engines = {
+        "presidio (full)": PresidioPiiEngine(get_analyzer),
+        "tiered (auto NER)": TieredPiiEngine(get_analyzer, ner_mode="auto"),
+        "tiered (patterns only)": TieredPiiEngine(get_analyzer, ner_mode="off"),
+    }
+
+    # Warm-up so spaCy model loading is not billed to the first engine
+    try:
+        get_analyzer()
+    except Exception as e:
+        print(f"[warn] Presidio unavailable ({type(e).__name__}: {e}); NER engines will be skipped\n")
+
+    reference = None
+    print(f"{'engine':24} {'mean ms':>8} {'p95 ms':>8} {'recall':>7} {'agree':>7} {'NER segs':>9}")
+    for name, engine in engines.items():
+        try:
+            timings, detections = run_engine(engine, sample, repeat)
+        except Exception as e:
+            print(f"{name:24} skipped: {type(e).__name__}: {e}")
+            continue
+        if name == "presidio (full)":
+            reference = detections
+        ms = sorted(t * 1000 for t in timings)
+        p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+        agree = "-" if reference is None else f"{agreement(reference, detections):.2f}"
+        ner = "-"
+        if isinstance(engine, TieredPiiEngine) and engine.segments_seen:
+            ner = f"{engine.segments_ner}/{engine.segments_seen}"
+        print(f"{name:24} {statistics.mean(ms):8.2f} {p95:8.2f} {label_recall(sample, detections):7.2f} {agree:>7} {ner:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Sweep chunking, top-k and embedding settings against a labelled query set.
+
+Usage:
+  # from the backend folder
+  python .\troubleshooting\retrieval_eval.py                        # uses troubleshooting/retrieval_eval_sample.jsonl
+  python .\troubleshooting\retrieval_eval.py my_labels.jsonl --chunk-sizes 256,512,1000 --overlaps 0,100,200 --k 3,5,10
+  python .\troubleshooting\retrieval_eval.py --embeddings hashing,azure --out sweep.csv
+
+Each line of the label file is {"query": "...", "index": "sla"|"kb", "expected": [...]}. An expected
+value is a ticket id (a chunk is relevant when it contains it), a "file.pdf#page" / "file.pdf" KB
+page reference (matched on chunk metadata), or any other text snippet the chunk must contain.
+Queries go through the same retrieval-query rule as the pipelines (the ticket id when present).
+
+For every (index, embeddings, chunk size, overlap) the script builds a throwaway index in a temp
+folder laid out like the served one (the SLA index as time-partitioned shards unless
+SLA_SHARDING=false, with the question passed as the shard time hint), then for every k reports recall@k, MRR, query latency (embed + search), mean prompt
+tokens of the retrieved context, index size on disk and build time. Rows matching the current
+settings (KB_CHUNK_SIZE/..., RETRIEVAL_K) are marked with *. Copy the winning values into
+backend/.env and rebuild the indexes to apply them.
+
+Embedding settings:
+  hashing[:DIM]  local lexical stand-in (hashed word counts), no network; default
+  fake[:DIM]     DeterministicFakeEmbedding; random vectors, only useful for size/latency
+  azure          the configured Azure OpenAI embeddings deployment(s); costs tokens
+  azure:DEPLOYMENT[@MODEL]
+                 one Azure OpenAI embeddings deployment (AZURE_OPENAI_ENDPOINT / _API_KEY /
+                 _API_VERSION), e.g. azure:emb-small@text-embedding-3-small; costs tokens
+  hf:MODEL       HuggingFaceEmbeddings (needs sentence-transformers); skipped if missing
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLE = os.path.join(HERE, "retrieval_eval_sample.jsonl")
+
+import multiple_data_processing as mdp
+from langchain_core.embeddings import Embeddings
+from sla_shards import build_sharded_store, open_sharded_store, sharding_enabled
+from ticket_fast_path import ticket_id_in_cell
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Approximate size of the fixed SLA prompt text around the context and question
+PROMPT_OVERHEAD = (
+    "\n\nImportant: The context and question have been anonymized; any PII values were replaced by "
+    "placeholders like __PII_0__. When returning the answer, do NOT invent new PII values. Use the "
+    "preserved ticket id as provided.\n\nQuestion: \nAnswer:"
+)
+
+
+class HashingEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: a deterministic, offline stand-in that still ranks by word overlap."""
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str):
+        vector = [0.0] * self.size
+        counts = {}
+        for token in _TOKEN.findall(text.lower()):
+            counts[token] = counts.get(token, 0) + 1
+        for token, n in counts.items():
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += (1.0 + math.log(n)) * (1 if digest[4] & 1 else -1)
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_embeddings(spec: str):
+    name, _, arg = spec.partition(":")
+    if name == "hashing":
+        return HashingEmbeddings(int(arg or 1024))
+    if name == "fake":
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+
+        return DeterministicFakeEmbedding(size=int(arg or 1536))
+    if name == "azure":
+        if not arg:
+            return mdp.initialize_embeddings()
+        from openai_gateway import AzureOpenAIGateway, Deployment
+
+        deployment, _, model = arg.partition("@")
+        dep = Deployment(
+            endpoint=os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPENAI_API_BASE"),
+            deployment=deployment,
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION") or os.getenv("OPENAI_API_VERSION"),
+            model=model or None,
+        )
+        return AzureOpenAIGateway(chat_deployments=[], embedding_deployments=[dep]).embeddings()
+    if name == "hf":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=arg or "sentence-transformers/all-MiniLM-L6-v2")
+    raise ValueError(f"Unknown embeddings setting: {spec}")
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text))
+    except Exception as e:
+        print(f"[warn] tiktoken encoding unavailable ({type(e).__name__}); prompt tokens estimated as characters / 4")
+        return lambda text: len(text) // 4
+
+
+def load_labels(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+def is_relevant(label: str, text: str, metadata: dict) -> bool:
+    if ticket_id_in_cell(label):
+        return label.upper() in text.upper()
+    if ".pdf" in label.lower():
+        source, _, page = label.partition("#")
+        return metadata.get("source", "").lower() == source.lower() and (not page or metadata.get("page") == page)
+    return label.lower() in text.lower()
+
+
+def load_source(index: str):
+    """Raw inputs read once per run; chunking happens per configuration."""
+    if index == "sla":
+        return mdp.load_sla_records()
+    return mdp.read_kb_documents()
+
+
+def chunk_source(index: str, source, chunk_size: int, chunk_overlap: int):
+    if index == "sla":
+        rows = [" ".join(str(v) for v in r.values()) for r in source]
+        return [(text, {}) for text in mdp.split_sla_rows(rows, chunk_size, chunk_overlap)]
+    return mdp.split_kb_documents(source, chunk_size, chunk_overlap)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for fname in files:
+            total += os.path.getsize(os.path.join(root, fname))
+    return total
+
+
+def evaluate(store, labels, k, count_tokens):
+    recalls, reciprocal_ranks, latencies, tokens = [], [], [], []
+    for item in labels:
+        started = time.perf_counter()
+        # Same call as the SLA pipeline: a sharded store picks its shards from the full question
+        docs = mdp.similarity_search(store, mdp._retrieval_query(item["query"]), k=k, time_hint=item["query"])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        expected = item["expected"]
+        found = set()
+        first_rank = None
+        for rank, doc in enumerate(docs, 1):
+            hits = {e for e in expected if is_relevant(e, doc.page_content, doc.metadata or {})}
+            if hits and first_rank is None:
+                first_rank = rank
+            found |= hits
+        recalls.append(len(found) / len(expected) if expected else 1.0)
+        reciprocal_ranks.append(1.0 / first_rank if first_rank else 0.0)
+        context = " ".join(doc.page_content for doc in docs)
+        tokens.append(count_tokens(context + PROMPT_OVERHEAD + item["query"]))
+
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "prompt_tokens": statistics.mean(tokens),
+    }
+
+
+def build_index(index, source, embeddings, chunk_size, chunk_overlap, persist_dir):
+    """(store, chunk count, build seconds) for one configuration, laid out like the served index."""
+    started = time.perf_counter()
+    if index == "sla" and sharding_enabled():
+        n_chunks = build_sharded_store(
+            persist_dir, embeddings, source, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            archive_dir=os.path.join(persist_dir, "archive"),
+        )
+        return open_sharded_store(persist_dir, embeddings), n_chunks, time.perf_counter() - started
+
+    from langchain_community.vectorstores import Chroma
+
+    chunks = chunk_source(index, source, chunk_size, chunk_overlap)
+    store = Chroma(embedding_function=embeddings, persist_directory=persist_dir)
+    for i in range(0, len(chunks), 50):
+        batch = chunks[i : i + 50]
+        store.add_texts([t for t, _ in batch], metadatas=[m or None for _, m in batch])
+    return store, len(chunks), time.perf_counter() - started
+
+
+def _current(index):
+    if index == "sla":
+        return mdp.SLA_CHUNK_SIZE, mdp.SLA_CHUNK_OVERLAP
+    return mdp.KB_CHUNK_SIZE, mdp.KB_CHUNK_OVERLAP
+
+
+def sweep(labels, indexes, embedding_specs, chunk_sizes, overlaps, ks, keep=False):
+    count_tokens = token_counter()
+    workdir = tempfile.mkdtemp(prefix="retrieval-eval-")
+    rows = []
+    try:
+        for index in indexes:
+            index_labels = [item for item in labels if item.get("index", "sla") == index]
+            source = load_source(index)
+            if not source:
+                print(f"[skip] {index}: no source data found")
+                continue
+            for spec in embedding_specs:
+                try:
+                    embeddings = make_embeddings(spec)
+                except Exception as e:
+                    print(f"[skip] {index} / {spec}: {type(e).__name__}: {e}")
+                    continue
+                for chunk_size in chunk_sizes:
+                    for overlap in overlaps:
+                        if overlap >= chunk_size:
+                            continue
+                        persist_dir = os.path.join(workdir, f"{index}-{spec.replace(':', '_')}-{chunk_size}-{overlap}")
+                        try:
+                            store, n_chunks, build_seconds = build_index(
+                                index, source, embeddings, chunk_size, overlap, persist_dir
+                            )
+                        except Exception as e:
+                            print(f"[skip] {index} / {spec} / {chunk_size}/{overlap}: build failed: {e}")
+                            continue
+                        size_mb = _dir_size(persist_dir) / 1e6
+                        for k in ks:
+                            result = evaluate(store, index_labels, k, count_tokens)
+                            current = (chunk_size, overlap) == _current(index) and k == mdp.RETRIEVAL_K
+                            rows.append({
+                                "index": index, "embeddings": spec, "chunk_size": chunk_size,
+                                "overlap": overlap, "k": k, "chunks": n_chunks,
+                                "build_s": round(build_seconds, 3), "size_mb": round(size_mb, 3),
+                                "current": current, **{name: round(v, 4) for name, v in result.items()},
+                            })
+                        layout = " in shards" if getattr(store, "supports_time_hint", False) else ""
+                        print(f"[done] {index} {spec} {chunk_size}/{overlap}: {n_chunks} chunks{layout}, "
+                              f"built in {build_seconds:.1f}s")
+    finally:
+        if keep:
+            print(f"Indexes kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def print_report(rows):
+    header = (f"  {'index':<5} {'embeddings':<12} {'chunk':>6} {'overlap':>7} {'k':>3} {'chunks':>6} "
+              f"{'recall@k':>8} {'MRR':>6} {'p50 ms':>7} {'p95 ms':>7} {'tokens':>7} {'build s':>7} {'MB':>6}")
+    print()
+    print(header)
+    order = sorted(rows, key=lambda r: (r["index"], -r["recall"], -r["mrr"], r["prompt_tokens"]))
+    for r in order:
+        print(f"{'*' if r['current'] else ' '} {r['index']:<5} {r['embeddings']:<12} {r['chunk_size']:>6} "
+              f"{r['overlap']:>7} {r['k']:>3} {r['chunks']:>6} {r['recall']:>8.3f} {r['mrr']:>6.3f} "
+              f"{r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} {r['prompt_tokens']:>7.0f} {r['build_s']:>7.2f} "
+              f"{r['size_mb']:>6.2f}")
+    print("\n* = current settings. Sorted by recall@k, then MRR, then prompt tokens.")
+    for index in sorted({r["index"] for r in rows}):
+        best = next(r for r in order if r["index"] == index)
+        prefix = index.upper()
+        print(f"Best {index}: {prefix}_CHUNK_SIZE={best['chunk_size']} {prefix}_CHUNK_OVERLAP={best['overlap']} "
+              f"RETRIEVAL_K={best['k']} ({best['embeddings']})")
+
+
+def write_rows(rows, path):
+    if path.endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=1)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"Results written to {path}")
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrieval quality / latency sweep over chunking, k and embeddings.")
+    parser.add_argument("labels", nargs="?", default=DEFAULT_SAMPLE, help="labelled queries (.jsonl)")
+    parser.add_argument("--index", choices=["sla", "kb", "all"], default="all",
+                        help="which index to evaluate (default: every index that has labels)")
+    parser.add_argument("--embeddings", default="hashing", help="comma list of embedding settings (default hashing)")
+    parser.add_argument("--chunk-sizes", type=_ints, default=[256, 512, 1000, 1500])
+    parser.add_argument("--overlaps", type=_ints, default=[0, 100, 200])
+    parser.add_argument("--k", type=_ints, default=[3, 5, 10, 20])
+    parser.add_argument("--out", help="also write every row to a .csv or .json file")
+    parser.add_argument("--keep", action="store_true", help="keep the throwaway indexes for inspection")
+    args = parser.parse_args(argv)
+
+    labels = load_labels(args.labels)
+    labelled = sorted({item.get("index", "sla") for item in labels})
+    indexes = labelled if args.index == "all" else [args.index]
+    print(f"{len(labels)} labelled queries ({', '.join(labelled)}) from {args.labels}")
+
+    rows = sweep(labels, indexes, [s.strip() for s in args.embeddings.split(",") if s.strip()],
+                 args.chunk_sizes, args.overlaps, args.k, keep=args.keep)
+    if not rows:
+        print("No configuration could be evaluated.")
+        return 1
+    print_report(rows)
+    if args.out:
+        write_rows(rows, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())